@@ -38,10 +38,7 @@ class AdventurerStatus(Enum):
     @classmethod
     def from_cn(cls, text: str):
         """根据中文描述返回对应的枚举实例，如果找不到返回 None"""
-        for key, val in ADVENTURER_STATUS_CN_MAP.items():
-            if val == text:
-                return cls(key)
-        return None
+        return ADVENTURER_STATUS_REVERSE.get(text)
 
 
 class QuestAssignStatus(Enum):
@@ -58,10 +55,7 @@ class QuestAssignStatus(Enum):
 
     @classmethod
     def from_cn(cls, text: str):
-        for key, val in QUEST_ASSIGN_STATUS_CN_MAP.items():
-            if val == text:
-                return cls(key)
-        return None
+        return QUEST_ASSIGN_STATUS_REVERSE.get(text)
 
 
 class QuestMaterialType(Enum):
@@ -75,7 +69,16 @@ class QuestMaterialType(Enum):
 
     @classmethod
     def from_cn(cls, text: str):
-        for key, val in QUEST_MATERIAL_TYPE_CN_MAP.items():
-            if val == text:
-                return cls(key)
-        return None
+        return QUEST_MATERIAL_TYPE_REVERSE.get(text)
+
+
+# 中文描述 -> 枚举实例 的反查表，模块加载时构建一次
+ADVENTURER_STATUS_REVERSE = {
+    v: AdventurerStatus(k) for k, v in ADVENTURER_STATUS_CN_MAP.items()
+}
+QUEST_ASSIGN_STATUS_REVERSE = {
+    v: QuestAssignStatus(k) for k, v in QUEST_ASSIGN_STATUS_CN_MAP.items()
+}
+QUEST_MATERIAL_TYPE_REVERSE = {
+    v: QuestMaterialType(k) for k, v in QUEST_MATERIAL_TYPE_CN_MAP.items()
+}
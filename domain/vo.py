@@ -1,22 +1,53 @@
-from dataclasses import dataclass, asdict, field
+from dataclasses import dataclass, field
 from typing import Optional, List
 from datetime import datetime
 import uuid
 from ..domain.status import AdventurerStatus, QuestMaterialType, QuestAssignStatus
 
-def _parse_datetime(value) -> Optional[datetime]:
+def _parse_datetime(
+    value, _fromiso=datetime.fromisoformat, _dt=datetime
+) -> Optional[datetime]:
     """统一处理 datetime 字符串/对象"""
     if value is None:
         return None
-    if isinstance(value, datetime):
-        return value
-    return datetime.fromisoformat(value)
+    # 数据库返回的绝大多数是字符串，优先走这条分支
+    if value.__class__ is str:
+        return _fromiso(value)
+    return value if isinstance(value, _dt) else _fromiso(value)
 
 
-@dataclass
+_QUEST_SEPARATOR = "-" * 40
+
+# 枚举值 -> 枚举实例，避免批量加载时反复走 Enum.__call__
+_ADV_STATUS_LOOKUP = {m.value: m for m in AdventurerStatus}
+_QUEST_ASSIGN_STATUS_LOOKUP = {m.value: m for m in QuestAssignStatus}
+_QUEST_MATERIAL_TYPE_LOOKUP = {m.value: m for m in QuestMaterialType}
+
+
+def _enum(lookup: dict, enum_cls, value):
+    """查表获取枚举实例；未知值（包括 None）交给 enum_cls 构造，与之前一样抛出 ValueError"""
+    return lookup.get(value) or enum_cls(value)
+
+
+def _new_id(_uuid4=uuid.uuid4) -> str:
+    """生成新的记录 id（数据库使用带连字符的 36 位 UUID）"""
+    return str(_uuid4())
+
+
+def _sid(value) -> str:
+    """统一处理 id 字段，已经是字符串时直接返回"""
+    return value if value.__class__ is str else str(value)
+
+
+def _fmt(dt: Optional[datetime]) -> Optional[str]:
+    """将 datetime 格式化为数据库使用的字符串"""
+    return dt.strftime("%Y-%m-%d %H:%M:%S") if dt else None
+
+
+@dataclass(slots=True)
 class Clienter:
-    id: str = field(default_factory=lambda: str(uuid.uuid4()))
-    created_at: Optional[datetime] = field(default_factory=datetime.now)
+    id: str = field(default_factory=_new_id)
+    created_at: Optional[datetime] = None
     name: Optional[str] = None
     contact_way: Optional[str] = None
     contact_number: Optional[str] = None
@@ -24,29 +55,32 @@ class Clienter:
     @staticmethod
     def from_dict(data: dict) -> "Clienter":
         return Clienter(
-            id=str(data["id"]),
+            id=_sid(data["id"]),
             created_at=_parse_datetime(data.get("created_at")),
             name=data.get("name"),
             contact_way=data.get("contact_way"),
             contact_number=data.get("contact_number"),
         )
 
-    @staticmethod
-    def from_list(datas: List[dict]) -> List["Clienter"]:
-        return [Clienter.from_dict(d) for d in datas]
+    @classmethod
+    def from_list(cls, datas: List[dict]) -> List["Clienter"]:
+        from_dict = cls.from_dict
+        return [from_dict(d) for d in datas]
 
     def to_dict(self) -> dict:
-        d = asdict(self)
-        d["created_at"] = (
-            self.created_at.strftime("%Y-%m-%d %H:%M:%S") if self.created_at else None
-        )
-        return d
+        return {
+            "id": self.id,
+            "created_at": _fmt(self.created_at),
+            "name": self.name,
+            "contact_way": self.contact_way,
+            "contact_number": self.contact_number,
+        }
 
 
-@dataclass
+@dataclass(slots=True)
 class Adventurer:
-    id: str = field(default_factory=lambda: str(uuid.uuid4()))
-    created_at: Optional[datetime] = field(default_factory=datetime.now)
+    id: str = field(default_factory=_new_id)
+    created_at: Optional[datetime] = None
     name: Optional[str] = None
     status: AdventurerStatus = field(default_factory=lambda: AdventurerStatus.IDLE)
     contact_way: Optional[str] = None
@@ -55,31 +89,36 @@ class Adventurer:
     @staticmethod
     def from_dict(data: dict) -> "Adventurer":
         return Adventurer(
-            id=str(data["id"]),
+            id=_sid(data["id"]),
             name=data.get("name"),
-            status=AdventurerStatus(data.get("status", "IDLE")),
+            status=_enum(
+                _ADV_STATUS_LOOKUP, AdventurerStatus, data.get("status", "IDLE")
+            ),
             contact_way=data.get("contact_way"),
             contact_number=data.get("contact_number"),
             created_at=_parse_datetime(data.get("created_at")),
         )
 
-    @staticmethod
-    def from_list(datas: List[dict]) -> List["Adventurer"]:
-        return [Adventurer.from_dict(d) for d in datas]
+    @classmethod
+    def from_list(cls, datas: List[dict]) -> List["Adventurer"]:
+        from_dict = cls.from_dict
+        return [from_dict(d) for d in datas]
 
     def to_dict(self) -> dict:
-        d = asdict(self)
-        d["status"] = self.status.value
-        d["created_at"] = (
-            self.created_at.strftime("%Y-%m-%d %H:%M:%S") if self.created_at else None
-        )
-        return d
+        return {
+            "id": self.id,
+            "created_at": _fmt(self.created_at),
+            "name": self.name,
+            "status": self.status.value,
+            "contact_way": self.contact_way,
+            "contact_number": self.contact_number,
+        }
 
 
-@dataclass
+@dataclass(slots=True)
 class Quest:
-    id: str = field(default_factory=lambda: str(uuid.uuid4()))
-    created_at: Optional[datetime] = field(default_factory=datetime.now)
+    id: str = field(default_factory=_new_id)
+    created_at: Optional[datetime] = None
     clienter_id: Optional[str] = None
     title: Optional[str] = None
     description: Optional[str] = None
@@ -90,7 +129,7 @@ class Quest:
     @staticmethod
     def from_dict(data: dict) -> "Quest":
         return Quest(
-            id=str(data["id"]),
+            id=_sid(data["id"]),
             created_at=_parse_datetime(data.get("created_at")),
             clienter_id=data.get("clienter_id"),
             title=data.get("title"),
@@ -100,48 +139,49 @@ class Quest:
             updated_at=_parse_datetime(data.get("updated_at")),
         )
 
-    @staticmethod
-    def from_list(datas: List[dict]) -> List["Quest"]:
-        return [Quest.from_dict(d) for d in datas]
+    @classmethod
+    def from_list(cls, datas: List[dict]) -> List["Quest"]:
+        from_dict = cls.from_dict
+        return [from_dict(d) for d in datas]
 
     def to_dict(self) -> dict:
-        d = asdict(self)
-        d["created_at"] = (
-            self.created_at.strftime("%Y-%m-%d %H:%M:%S") if self.created_at else None
+        return {
+            "id": self.id,
+            "created_at": _fmt(self.created_at),
+            "clienter_id": self.clienter_id,
+            "title": self.title,
+            "description": self.description,
+            "reward": self.reward,
+            "deadline": _fmt(self.deadline),
+            "updated_at": _fmt(self.updated_at),
+        }
+
+    def format_quest(self) -> str:
+        """将单个 Quest 格式化为可读文本"""
+        return (
+            f"任务ID: {self.id}\n"
+            f"标题: {self.title}\n"
+            f"描述: {self.description}\n"
+            f"奖励: {self.reward}\n"
+            f"截止时间: {_fmt(self.deadline) or '无'}\n"
+            f"创建时间: {_fmt(self.created_at) or '未知'}\n"
+            f"{_QUEST_SEPARATOR}"
         )
-        if self.deadline:
-            d["deadline"] = self.deadline.strftime("%Y-%m-%d %H:%M:%S")
-        if self.updated_at:
-            d["updated_at"] = self.updated_at.strftime("%Y-%m-%d %H:%M:%S")
-        return d
 
     @staticmethod
     def format_quests(quests: List["Quest"]) -> str:
         """将 Quest 列表格式化为可读文本"""
         if not quests:
             return "当前没有任务。"
+        return "\n".join(map(Quest.format_quest, quests))
 
-        lines = []
-        for q in quests:
-            line = (
-                f"任务ID: {q.id}\n"
-                f"标题: {q.title}\n"
-                f"描述: {q.description}\n"
-                f"奖励: {q.reward}\n"
-                f"截止时间: {q.deadline.strftime('%Y-%m-%d %H:%M:%S') if q.deadline else '无'}\n"
-                f"创建时间: {q.created_at.strftime('%Y-%m-%d %H:%M:%S') if q.created_at else '未知'}\n"
-                f"{'-'*40}"
-            )
-            lines.append(line)
-        return "\n".join(lines)
-
-
-@dataclass
+
+@dataclass(slots=True)
 class QuestAssign:
-    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = field(default_factory=_new_id)
     quest_id: Optional[str] = None
     adventurer_id: Optional[str] = None
-    assign_time: Optional[datetime] = field(default_factory=datetime.now)
+    assign_time: Optional[datetime] = None
     submit_time: Optional[datetime] = None
     confirm_time: Optional[datetime] = None
     status: QuestAssignStatus = (
@@ -151,92 +191,99 @@ class QuestAssign:
     @staticmethod
     def from_dict(data: dict) -> "QuestAssign":
         return QuestAssign(
-            id=str(data["id"]),
+            id=_sid(data["id"]),
             quest_id=data.get("quest_id"),
             adventurer_id=data.get("adventurer_id"),
             assign_time=_parse_datetime(data.get("assign_time")),
             submit_time=_parse_datetime(data.get("submit_time")),
             confirm_time=_parse_datetime(data.get("confirm_time")),
-            status=data.get("status", "UNANSWERED"),
+            status=_enum(
+                _QUEST_ASSIGN_STATUS_LOOKUP,
+                QuestAssignStatus,
+                data.get("status", "UNANSWERED"),
+            ),
         )
 
-    @staticmethod
-    def from_list(datas: List[dict]) -> List["QuestAssign"]:
-        return [QuestAssign.from_dict(d) for d in datas]
+    @classmethod
+    def from_list(cls, datas: List[dict]) -> List["QuestAssign"]:
+        from_dict = cls.from_dict
+        return [from_dict(d) for d in datas]
 
     def to_dict(self) -> dict:
-        d = asdict(self)
-        d["assign_time"] = (
-            self.assign_time.strftime("%Y-%m-%d %H:%M:%S") if self.assign_time else None
-        )
-        d["submit_time"] = (
-            self.submit_time.strftime("%Y-%m-%d %H:%M:%S") if self.submit_time else None
-        )
-        d["confirm_time"] = (
-            self.confirm_time.strftime("%Y-%m-%d %H:%M:%S")
-            if self.confirm_time
-            else None
-        )
-        # 将枚举转换为字符串值
-        d["status"] = self.status.value if isinstance(self.status, QuestAssignStatus) else self.status
-        return d
-
-
-@dataclass
+        return {
+            "id": self.id,
+            "quest_id": self.quest_id,
+            "adventurer_id": self.adventurer_id,
+            "assign_time": _fmt(self.assign_time),
+            "submit_time": _fmt(self.submit_time),
+            "confirm_time": _fmt(self.confirm_time),
+            "status": self.status.value,
+        }
+
+
+@dataclass(slots=True)
 class SystemLog:
-    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = field(default_factory=_new_id)
     event: Optional[str] = None
     detail: Optional[str] = None
-    created_at: Optional[datetime] = field(default_factory=datetime.now)
+    created_at: Optional[datetime] = None
 
     @staticmethod
     def from_dict(data: dict) -> "SystemLog":
         return SystemLog(
-            id=str(data["id"]),
+            id=_sid(data["id"]),
             event=data.get("event"),
             detail=data.get("detail"),
             created_at=_parse_datetime(data.get("created_at")),
         )
 
-    @staticmethod
-    def from_list(datas: List[dict]) -> List["SystemLog"]:
-        return [SystemLog.from_dict(d) for d in datas]
+    @classmethod
+    def from_list(cls, datas: List[dict]) -> List["SystemLog"]:
+        from_dict = cls.from_dict
+        return [from_dict(d) for d in datas]
 
     def to_dict(self) -> dict:
-        d = asdict(self)
-        d["created_at"] = (
-            self.created_at.strftime("%Y-%m-%d %H:%M:%S") if self.created_at else None
-        )
-        return d
+        return {
+            "id": self.id,
+            "event": self.event,
+            "detail": self.detail,
+            "created_at": _fmt(self.created_at),
+        }
 
 
-@dataclass
+@dataclass(slots=True)
 class QuestMaterial:
-    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = field(default_factory=_new_id)
     quest_id: Optional[str] = None
     material_name: Optional[str] = None
     file_path: Optional[str] = None
-    upload_time: Optional[datetime] = field(default_factory=datetime.now)
-    type: str = QuestMaterialType.NONE
+    upload_time: Optional[datetime] = None
+    type: QuestMaterialType = QuestMaterialType.NONE
 
     @staticmethod
     def from_dict(data: dict) -> "QuestMaterial":
         return QuestMaterial(
-            id=str(data["id"]),
+            id=_sid(data["id"]),
             quest_id=data.get("quest_id"),
             material_name=data.get("material_name"),
             file_path=data.get("file_path"),
             upload_time=_parse_datetime(data.get("upload_time")),
-            type=data.get("type", "NONE"),
+            type=_enum(
+                _QUEST_MATERIAL_TYPE_LOOKUP, QuestMaterialType, data.get("type", "NONE")
+            ),
         )
 
-    @staticmethod
-    def from_list(datas: List[dict]) -> List["QuestMaterial"]:
-        return [QuestMaterial.from_dict(d) for d in datas]
+    @classmethod
+    def from_list(cls, datas: List[dict]) -> List["QuestMaterial"]:
+        from_dict = cls.from_dict
+        return [from_dict(d) for d in datas]
 
     def to_dict(self) -> dict:
-        d = asdict(self)
-        d["upload_time"] = (
-            self.upload_time.strftime("%Y-%m-%d %H:%M:%S") if self.upload_time else None
-        )
-        return d
+        return {
+            "id": self.id,
+            "quest_id": self.quest_id,
+            "material_name": self.material_name,
+            "file_path": self.file_path,
+            "upload_time": _fmt(self.upload_time),
+            "type": self.type.value,
+        }
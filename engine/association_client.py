@@ -5,66 +5,70 @@ from typing import List
 import uuid
 
 from ..engine.supa_client import SupabaseClient
+from ..utils.ttl_cache import TTLCache
 
 from ..domain.status import AdventurerStatus, QuestAssignStatus, QuestMaterialType
-from ..domain.vo import Adventurer, Clienter, Quest, QuestAssign, QuestMaterial
+from ..domain.vo import Adventurer, Clienter, Quest, QuestMaterial
 
 from astrbot.api import logger
 
+# 注册结果状态与身份的对应关系
+_EXISTS_TO_ROLE = {"exists_adv": "adventurer", "exists_cli": "clienter"}
+_ROLE_TO_EXISTS = {role: status for status, role in _EXISTS_TO_ROLE.items()}
+
+# 冒险者可由玩家主动切换的状态：目标状态 -> 允许的来源状态
+_ADVENTURER_TRANSITIONS = {
+    AdventurerStatus.REST: [AdventurerStatus.IDLE],
+    AdventurerStatus.IDLE: [AdventurerStatus.WORKING, AdventurerStatus.REST],
+    AdventurerStatus.QUIT: [
+        AdventurerStatus.IDLE,
+        AdventurerStatus.WORKING,
+        AdventurerStatus.REST,
+    ],
+}
+
 
 class AssociationClient:
     """ """
 
     def __init__(self, supa_client: SupabaseClient):
         self.supa_client = supa_client
+        # (contact_way, contact_number) -> 身份，注册后身份不会消失，只缓存已注册的结果
+        self._role_cache = TTLCache(maxsize=4096, ttl=300)
+        # 可接取任务列表的格式化文本，所有冒险者共享；发布、接取成功时失效
+        self._available_quests_cache = TTLCache(maxsize=1, ttl=5)
 
     # 检查
-    async def is_adventurer(self, contact_way: str, contact_number: str) -> bool:
+    async def get_user_role(self, contact_way: str, contact_number: str) -> str | None:
         """
-        检查用户是否已注册为冒险者。
+        获取用户已注册的身份，一次查询同时检查冒险者和委托人。
 
         Args:
             contact_way (str): 平台名称，例如 "telegram" 或 "aiocqhttp"
             contact_number (str): 用户在该平台的唯一标识
 
         Returns:
-            bool: True 表示已注册，False 表示未注册
+            str | None: "adventurer" 或 "clienter"，未注册返回 None
         """
+        key = (contact_way, contact_number)
+        role = self._role_cache.get(key)
+        if role:
+            return role
         try:
-            adv_id = await self.supa_client.get_adventurer_id_by_way_number(
-                contact_way, contact_number
-            )
-            return adv_id is not None
+            role = await self.supa_client.get_user_role(contact_way, contact_number)
+            if role:
+                self._role_cache.set(key, role)
+            return role
         except Exception as e:
-            logger.error(f"检查冒险者注册状态失败: {e}")
-            return False
-
-    async def is_clienter(self, contact_way: str, contact_number: str) -> bool:
-        """
-        检查用户是否已注册为委托人。
-
-        Args:
-            contact_way (str): 平台名称，例如 "telegram" 或 "aiocqhttp"
-            contact_number (str): 用户在该平台的唯一标识
-
-        Returns:
-            bool: True 表示已注册，False 表示未注册
-        """
-        try:
-            adv_id = await self.supa_client.get_clienter_id_by_way_number(
-                contact_way, contact_number
-            )
-            return adv_id is not None
-        except Exception as e:
-            logger.error(f"检查委托人注册状态失败: {e}")
-            return False
+            logger.error(f"查询用户身份失败: {e}")
+            return None
 
     # 注册相关
     async def register_adventurer(
         self, name: str, contact_way: str, contact_number: str
-    ) -> Adventurer | None:
+    ) -> tuple[str, Adventurer | None] | None:
         """
-        注册一个新的冒险者到数据库。
+        注册一个新的冒险者到数据库，已注册检查与插入在同一次调用中完成。
 
         Args:
             name (str): 冒险者名称
@@ -72,24 +76,23 @@ class AssociationClient:
             contact_number (str): 用户在平台的唯一标识
 
         Returns:
-            Adventurer | None: 注册成功返回 Adventurer 实例，失败返回 None
+            tuple[str, Adventurer | None] | None:
+                (状态, 冒险者)，状态为 "ok"（注册成功）、"exists_adv" 或 "exists_cli"
+                （已注册为冒险者 / 委托人）；调用失败返回 None
         """
-        adventurer = Adventurer(
-            name=name,
-            contact_way=contact_way,
-            contact_number=contact_number,
+        return await self._register(
+            "adventurer",
+            self.supa_client.register_adventurer,
+            name,
+            contact_way,
+            contact_number,
         )
-        success = await self.supa_client.insert_adventurer(adventurer)
-        if success:
-            return adventurer
-        logger.error(f"注册冒险者失败: {adventurer}")
-        return None
 
     async def register_clienter(
         self, name: str, contact_way: str, contact_number: str
-    ) -> Clienter | None:
-        """ 
-        注册一个新的委托人到数据库。
+    ) -> tuple[str, Clienter | None] | None:
+        """
+        注册一个新的委托人到数据库，已注册检查与插入在同一次调用中完成。
 
         Args:
             name (str): 委托人名称
@@ -97,29 +100,65 @@ class AssociationClient:
             contact_number (str): 用户在平台的唯一标识
 
         Returns:
-            Clienter | None: 注册成功返回 Clienter 实例，失败返回 None
+            tuple[str, Clienter | None] | None:
+                (状态, 委托人)，状态为 "ok"（注册成功）、"exists_adv" 或 "exists_cli"
+                （已注册为冒险者 / 委托人）；调用失败返回 None
         """
-        clienter = Clienter(
-            name=name,
-            contact_way=contact_way,
-            contact_number=contact_number,
+        return await self._register(
+            "clienter",
+            self.supa_client.register_clienter,
+            name,
+            contact_way,
+            contact_number,
         )
-        success = await self.supa_client.insert_clienter(clienter)
-        if success:
-            return clienter
-        logger.error(f"注册委托人失败: {clienter}")
-        return None
 
-    async def register_quest(
+    async def _register(
+        self,
+        role: str,
+        register_fn,
+        name: str,
+        contact_way: str,
+        contact_number: str,
+    ) -> tuple[str, Adventurer | Clienter | None] | None:
+        """
+        注册冒险者 / 委托人的公共流程：缓存中已有身份时不再访问数据库
+
+        Args:
+            role (str): 要注册的身份，"adventurer" 或 "clienter"
+            register_fn: SupabaseClient 中对应的注册方法
+            name (str): 用户名称
+            contact_way (str): 平台名称
+            contact_number (str): 用户在平台的唯一标识
+
+        Returns:
+            tuple[str, Adventurer | Clienter | None] | None: 同 register_adventurer
+        """
+        key = (contact_way, contact_number)
+        cached_role = self._role_cache.get(key)
+        if cached_role:
+            return _ROLE_TO_EXISTS[cached_role], None
+
+        result = await register_fn(name, contact_way, contact_number)
+        if result is None:
+            logger.error(f"注册 {role} 失败: {contact_way}:{contact_number}")
+            return None
+
+        status, record = result
+        registered_role = role if status == "ok" else _EXISTS_TO_ROLE.get(status)
+        if registered_role:
+            self._role_cache.set(key, registered_role)
+        return status, record
+
+    async def publish_quest(
         self,
         clienter_id: str,
         title: str,
         description: str | None = None,
         reward: float = 0.0,
         deadline: datetime | None = None,
-    ) -> Quest | None:
+    ) -> tuple[Quest, list[Adventurer]] | None:
         """
-        创建并注册一条新的任务（Quest）。
+        发布任务，并一并返回需要推送的空闲冒险者。
 
         Args:
             clienter_id (str): 发布任务的委托人ID
@@ -129,36 +168,20 @@ class AssociationClient:
             deadline (datetime | None): 任务截止时间
 
         Returns:
-            Quest | None: 注册成功返回 Quest 实例，失败返回 None
+            tuple[Quest, list[Adventurer]] | None: (新任务, 空闲冒险者列表)，失败返回 None
         """
         if not clienter_id or not title:
-            logger.error("任务注册失败：缺少 clienter_id 或 title")
+            logger.error("任务发布失败：缺少 clienter_id 或 title")
             return None
 
-        quest = Quest(
-            clienter_id=clienter_id,
-            title=title,
-            description=description,
-            reward=reward,
-            deadline=deadline,
-            created_at=datetime.now(),
+        result = await self.supa_client.publish_quest(
+            clienter_id, title, description, reward, deadline
         )
-
-        try:
-            success = await self.supa_client.insert_quest(quest)
-            if success:
-                quest_assign = QuestAssign(
-                    quest_id=quest.id,
-                )
-                success = await self.supa_client.insert_quest_assign(quest_assign)
-                if success:
-                    return quest
-            else:
-                logger.error("任务注册失败：数据库插入失败")
-                return None
-        except Exception as e:
-            logger.error(f"任务注册失败: {e}")
+        if not result:
+            logger.error("任务发布失败：数据库插入失败")
             return None
+        self._available_quests_cache.clear()
+        return result
 
     async def save_quest_attachment(
         self, quest_id: str, file_path: str, type: QuestMaterialType
@@ -173,15 +196,7 @@ class AssociationClient:
         Returns:
             QuestMaterial | None: 成功返回材料对象，失败返回None
         """
-        # 确保path是Path对象以便获取suffix
-        path_obj = Path(file_path) if isinstance(file_path, str) else file_path
-
-        qm = QuestMaterial(
-            quest_id=quest_id,
-            material_name=os.path.basename(path_obj),
-            file_path=str(path_obj),  # 转换为字符串存储
-            type=type.value,  # 使用枚举的值
-        )
+        qm = self._build_quest_material(quest_id, file_path, type, datetime.now())
         try:
             success = await self.supa_client.insert_quest_material(qm)
             if success:
@@ -205,12 +220,42 @@ class AssociationClient:
         Returns:
             List[QuestMaterial]: 成功保存的材料对象列表
         """
-        results = []
-        for path, material_type in paths:
-            qm = self.save_quest_attachment(quest_id, path, material_type)
-            if qm:
-                results.append(qm)
-        return results
+        if not paths:
+            return []
+
+        now = datetime.now()
+        materials = [
+            self._build_quest_material(quest_id, path, material_type, now)
+            for path, material_type in paths
+        ]
+        try:
+            if await self.supa_client.insert_quest_materials(materials):
+                return materials
+            logger.error("任务材料批量注册失败：数据库插入失败")
+        except Exception as e:
+            logger.error(f"任务材料批量注册失败: {e}")
+        return []
+
+    @staticmethod
+    def _build_quest_material(
+        quest_id: str,
+        file_path: str | Path,
+        type: QuestMaterialType,
+        upload_time: datetime,
+    ) -> QuestMaterial:
+        """根据文件路径构建任务材料对象"""
+        # 字符串路径直接取文件名，不再构造 Path 对象
+        if isinstance(file_path, str):
+            name, str_path = os.path.basename(file_path), file_path
+        else:
+            name, str_path = file_path.name, str(file_path)
+        return QuestMaterial(
+            quest_id=quest_id,
+            material_name=name,
+            file_path=str_path,
+            upload_time=upload_time,
+            type=type,
+        )
 
     async def get_quest_attachments(
         self, quest_id: str, type: QuestMaterialType
@@ -224,26 +269,53 @@ class AssociationClient:
         return materials
 
     # 冒险者相关
-    async def get_adventurer_status_by_id(
+    async def get_adventurer_id_and_status(
         self, contact_way: str, contact_number: str
-    ) -> AdventurerStatus | None:
+    ) -> tuple[str, AdventurerStatus] | None:
         """
-        根据平台和用户编号获取冒险者的当前状态。
+        一次查询获取冒险者的 ID 和当前状态。
 
         Args:
             contact_way (str): 平台名称，例如 "telegram" 或 "aiocqhttp"
             contact_number (str): 用户在该平台的唯一标识
 
         Returns:
-            AdventurerStatus | None: 返回冒险者状态，如果未找到冒险者返回 None
+            tuple[str, AdventurerStatus] | None: (冒险者ID, 状态)，未找到冒险者返回 None
         """
-        adventurer = await self.supa_client.get_adventurer_by_way_number(
-            contact_way, contact_number
-        )
-        if not adventurer:
-            logger.warning(f"未找到冒险者: {contact_way} - {contact_number}")
+        try:
+            return await self.supa_client.get_adventurer_id_status_by_way_number(
+                contact_way, contact_number
+            )
+        except Exception as e:
+            logger.error(f"查询冒险者状态失败: {e}")
             return None
-        return adventurer.status
+
+    async def transition_adventurer_status(
+        self, contact_way: str, contact_number: str, new_status: AdventurerStatus
+    ) -> tuple[bool, AdventurerStatus | None]:
+        """
+        按状态机切换冒险者状态，检查与更新在数据库端一次完成。
+
+        Args:
+            contact_way (str): 平台名称，例如 "telegram" 或 "aiocqhttp"
+            contact_number (str): 用户在该平台的唯一标识
+            new_status (AdventurerStatus): 目标状态（REST / IDLE / QUIT）
+
+        Returns:
+            tuple[bool, AdventurerStatus | None]:
+                成功返回 (True, 新状态)；未切换返回 (False, 当前状态)，
+                未找到冒险者时当前状态为 None
+        """
+        if await self.supa_client.transition_adventurer_status(
+            contact_way,
+            contact_number,
+            new_status,
+            _ADVENTURER_TRANSITIONS[new_status],
+        ):
+            return True, new_status
+        # 未切换时再读取当前状态，供调用方给出原因
+        adv = await self.get_adventurer_id_and_status(contact_way, contact_number)
+        return False, adv[1] if adv else None
 
     # 任务相关
     async def get_quest_assign_status_by_quest_adventurer(
@@ -259,17 +331,13 @@ class AssociationClient:
         Returns:
             QuestAssignStatus | None: 返回任务分配状态，如果未找到返回 None
         """
-        quest_assigns = await self.supa_client.get_quest_assigns_by_quest_id(quest_id)
-        if not quest_assigns:
-            logger.warning(f"未找到任务 {quest_id} 的分配记录")
+        quest_assign = await self.supa_client.get_quest_assign_by_quest_and_adventurer(
+            quest_id, adventurer_id
+        )
+        if not quest_assign:
+            logger.warning(f"未找到冒险者 {adventurer_id} 对任务 {quest_id} 的分配记录")
             return None
-
-        for qa in quest_assigns:
-            if qa.adventurer_id == adventurer_id:
-                return QuestAssignStatus(qa.status)
-
-        logger.warning(f"未找到冒险者 {adventurer_id} 对任务 {quest_id} 的分配记录")
-        return None
+        return quest_assign.status
 
     async def accept_quest_by_id(self, quest_id: str, adventurer_id: str) -> Quest | None:
         """
@@ -282,52 +350,31 @@ class AssociationClient:
         Returns:
             Quest | None: 返回任务实例，如果任务不存在或已被接取返回 None
         """
-        # 获取任务
-        quest = await self.supa_client.get_quest_by_id(quest_id)
+        quest = await self.supa_client.accept_quest(quest_id, adventurer_id)
         if not quest:
-            logger.warning(f"任务 {quest_id} 不存在")
-            return None
-
-        # 检查任务是否已被接取（通过 quest_assign 表查询 ONGOING 状态的记录）
-        existing_assigns = await self.supa_client.get_quest_assigns_by_quest_id(quest_id)
-        if existing_assigns:
-            for assign in existing_assigns:
-                if assign.status == QuestAssignStatus.ONGOING.value:
-                    logger.warning(
-                        f"任务 {quest_id} 已被冒险者 {assign.adventurer_id} 接取"
-                    )
-                    return None
-
-        # 更新冒险者状态为 WORKING
-        adventurer = await self.supa_client.get_adventurer_by_id(adventurer_id)
-        if not adventurer:
-            logger.warning(f"未找到冒险者 {adventurer_id}")
+            logger.warning(
+                f"接取失败：任务 {quest_id} 不存在、已被接取或冒险者 {adventurer_id} 不空闲"
+            )
             return None
+        self._available_quests_cache.clear()
+        return quest
 
-        adventurer.status = AdventurerStatus.WORKING
-        if not await self.supa_client.update_adventurer(adventurer):
-            logger.error(f"更新冒险者 {adventurer_id} 状态失败")
-            return None
+    async def get_available_quests_text(self) -> str | None:
+        """
+        获取可接取任务列表的格式化文本，结果在所有冒险者之间短期共享。
 
-        # 创建 quest_assign 记录
-        quest_assign = QuestAssign(
-            quest_id=quest_id,
-            adventurer_id=adventurer_id,
-            status=QuestAssignStatus.ONGOING.value,
-        )
-        if not await self.supa_client.insert_quest_assign(quest_assign):
-            logger.error(f"创建任务分配记录失败: {quest_id} -> {adventurer_id}")
-            # 回滚冒险者状态
-            adventurer.status = AdventurerStatus.IDLE
-            await self.supa_client.update_adventurer(adventurer)
+        Returns:
+            str | None: 任务列表文本，没有可接取任务或查询失败返回 None
+        """
+        text = self._available_quests_cache.get("text")
+        if text is not None:
+            return text
+        quests = await self.supa_client.get_available_quests()
+        if not quests:
             return None
-
-        # 记录系统日志
-        await self.supa_client.log_event(
-            event="接取任务", detail=f"冒险者 {adventurer_id} 接取任务 {quest_id}"
-        )
-
-        return quest
+        text = Quest.format_quests(quests)
+        self._available_quests_cache.set("text", text)
+        return text
 
     async def submit_quest(self, adventurer_id: str, quest_id: str) -> Quest | None:
         """
@@ -341,44 +388,17 @@ class AssociationClient:
         Returns:
             Quest | None: 返回任务对象；失败返回 None
         """
-        # 获取任务
-        quest = await self.supa_client.get_quest_by_id(quest_id)
+        quest = await self.supa_client.submit_quest(adventurer_id, quest_id)
         if not quest:
-            logger.warning(f"提交失败：任务 {quest_id} 不存在")
-            return None
-
-        # 获取当前 ONGOING 状态的任务分配记录
-        quest_assign = await self.supa_client.get_quest_assign_by_adventurer_status(
-            adventurer_id, QuestAssignStatus.ONGOING.value
-        )
-        if not quest_assign:
-            logger.warning(f"提交失败：冒险者 {adventurer_id} 没有正在执行的任务")
-            return None
-
-        # 权限检查：任务分配记录的任务ID必须匹配
-        if quest_assign.quest_id != quest_id:
             logger.warning(
-                f"提交失败：冒险者 {adventurer_id} 当前执行的任务是 {quest_assign.quest_id}，不是 {quest_id}"
+                f"提交失败：任务 {quest_id} 不存在或不是冒险者 {adventurer_id} 正在执行的任务"
             )
             return None
-
-        # 更新 quest_assign 记录为 SUBMITTED 状态
-        quest_assign.status = QuestAssignStatus.SUBMITTED.value
-        quest_assign.submit_time = datetime.now()
-        if not await self.supa_client.update_quest_assign(quest_assign):
-            logger.error(f"更新任务分配记录失败: {quest_assign.id}")
-            return None
-
-        # 记录系统日志
-        await self.supa_client.log_event(
-            event="提交任务", detail=f"冒险者 {adventurer_id} 提交任务 {quest_id}"
-        )
-
         return quest
 
     async def confirm_quest(
         self, clienter_id: str, quest_id: str
-    ) -> tuple[Quest, str] | None:
+    ) -> tuple[Quest, str, Adventurer | None] | None:
         """
         委托人确认任务完成，更新 quest_assign 状态为 CONFIRMED，设置确认时间。
         同时将冒险者状态设为 IDLE。
@@ -388,87 +408,13 @@ class AssociationClient:
             quest_id (str): 任务 ID
 
         Returns:
-            tuple[Quest, str] | None: 返回 (任务对象, 冒险者ID)；失败返回 None
-        """
-        # 获取任务
-        quest = await self.supa_client.get_quest_by_id(quest_id)
-        if not quest:
-            logger.warning(f"确认失败：任务 {quest_id} 不存在")
-            return None
-
-        # 权限检查：必须是任务的委托人
-        if quest.clienter_id != clienter_id:
-            logger.warning(f"确认失败：委托人 {clienter_id} 无权确认任务 {quest_id}")
-            return None
-
-        # 查找该任务的 SUBMITTED 状态的分配记录
-        quest_assigns = await self.supa_client.get_quest_assigns_by_quest_id(quest_id)
-        if not quest_assigns:
-            logger.warning(f"确认失败：任务 {quest_id} 没有分配记录")
-            return None
-
-        submitted_assign = None
-        for qa in quest_assigns:
-            if qa.status == QuestAssignStatus.SUBMITTED.value:
-                submitted_assign = qa
-                break
-
-        if not submitted_assign:
-            logger.warning(f"确认失败：任务 {quest_id} 没有已提交的分配记录")
-            return None
-
-        # 更新 quest_assign 为 CONFIRMED 状态
-        submitted_assign.status = QuestAssignStatus.CONFIRMED.value
-        submitted_assign.confirm_time = datetime.now()
-        if not await self.supa_client.update_quest_assign(submitted_assign):
-            logger.error(f"更新任务分配记录失败: {submitted_assign.id}")
-            return None
-
-        # 更新冒险者状态为 IDLE
-        adventurer = await self.supa_client.get_adventurer_by_id(
-            submitted_assign.adventurer_id
-        )
-        if adventurer:
-            adventurer.status = AdventurerStatus.IDLE
-            if not await self.supa_client.update_adventurer(adventurer):
-                logger.error(f"更新冒险者 {submitted_assign.adventurer_id} 状态失败")
-        else:
-            logger.warning(
-                f"未找到冒险者 {submitted_assign.adventurer_id}，无法更新其状态"
-            )
-
-        # 记录系统日志
-        await self.supa_client.log_event(
-            event="确认任务", detail=f"委托人 {clienter_id} 确认任务 {quest_id} 完成"
-        )
-
-        return quest, submitted_assign.adventurer_id
-
-    async def get_running_quest_by_adventurer_id(
-        self, adventurer_id: str
-    ) -> tuple[Quest, QuestAssign] | None:
-        """
-        获取冒险者当前正在执行的任务及其分配记录。
-
-        Args:
-            adventurer_id (str): 冒险者ID
-
-        Returns:
-            tuple[Quest, QuestAssign] | None: 返回 (任务对象, 任务分配记录)；未找到返回 None
+            tuple[Quest, str, Adventurer | None] | None:
+                返回 (任务对象, 冒险者ID, 冒险者)；失败返回 None
         """
-        # 获取冒险者当前 ONGOING 状态的任务分配记录
-        quest_assign = await self.supa_client.get_active_quest_assign_by_adventurer(
-            adventurer_id
-        )
-        if not quest_assign:
-            return None
-
-        # 获取对应的任务
-        quest = await self.supa_client.get_quest_by_id(quest_assign.quest_id)
-        if not quest:
+        result = await self.supa_client.confirm_quest(clienter_id, quest_id)
+        if not result:
             logger.warning(
-                f"任务分配记录 {quest_assign.id} 指向的任务 {quest_assign.quest_id} 不存在"
+                f"确认失败：任务 {quest_id} 不存在、委托人 {clienter_id} 无权确认或没有已提交的分配记录"
             )
             return None
-
-        return quest, quest_assign
+        return result
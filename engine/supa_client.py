@@ -1,4 +1,7 @@
-from supabase import acreate_client, AsyncClient
+from datetime import datetime
+
+import httpx
+from supabase import acreate_client, AsyncClient, AsyncClientOptions
 
 from ..domain.status import AdventurerStatus, QuestAssignStatus, QuestMaterialType
 from ..domain.vo import (
@@ -9,6 +12,7 @@ from ..domain.vo import (
     SystemLog,
     QuestMaterial,
 )
+from ..utils.ttl_cache import TTLCache
 
 from astrbot.api import logger
 
@@ -27,6 +31,10 @@ class SupabaseClient:
         self.url: str | None = None
         self.key: str | None = None
         self.client: AsyncClient | None = None
+        self.http_client: httpx.AsyncClient | None = None
+        # (contact_way, contact_number) -> id，身份与 ID 的对应关系注册后不会改变
+        self._adventurer_id_cache = TTLCache(maxsize=10_000, ttl=300)
+        self._clienter_id_cache = TTLCache(maxsize=10_000, ttl=300)
 
     @classmethod
     async def create(cls, url: str | None = None, key: str | None = None) -> "SupabaseClient":
@@ -48,11 +56,38 @@ class SupabaseClient:
         instance.key = key
         if not instance.url or not instance.key:
             raise ValueError("缺少 SUPABASE_URL 或 SUPABASE_KEY")
-        instance.client = await acreate_client(instance.url, instance.key)
+        # 所有请求共享一个带 keep-alive 连接池的 httpx 客户端，避免每次请求重新握手；
+        # 启用 HTTP/2，并发请求可在同一 TLS 连接上多路复用
+        instance.http_client = httpx.AsyncClient(
+            http2=True,
+            timeout=10.0,
+            limits=httpx.Limits(
+                max_connections=50,
+                max_keepalive_connections=25,
+                keepalive_expiry=60,
+            ),
+        )
+        instance.client = await acreate_client(
+            instance.url,
+            instance.key,
+            options=AsyncClientOptions(httpx_client=instance.http_client),
+        )
         return instance
 
+    async def close(self):
+        """关闭底层 HTTP 连接池"""
+        if self.http_client:
+            await self.http_client.aclose()
+            self.http_client = None
+
     # ========================== 查询 ==========================
-    async def _get_records(self, table: str, filters: dict) -> list[dict] | None:
+    async def _get_records(
+        self,
+        table: str,
+        filters: dict,
+        limit: int | None = None,
+        columns: str = "*",
+    ) -> list[dict] | None:
         """
         通用方法：根据条件从指定表获取多条记录
 
@@ -60,47 +95,82 @@ class SupabaseClient:
             table (str): 数据表名称
             filters (dict, optional): 查询条件，例如 {"status": "PUBLISHED"}。
                                     如果为 None，则返回表中所有记录。
+            limit (int, optional): 最多返回的记录数，为 None 时不限制
+            columns (str, optional): 要返回的列，例如 "id"，默认返回全部列
 
         Returns:
             list[dict]: 返回符合条件的记录列表，如果没有找到返回None
         """
         try:
-            query = self.client.table(table).select("*")
+            query = self.client.table(table).select(columns)
             if filters:
                 for key, value in filters.items():
                     query = query.eq(key, value)
+            if limit is not None:
+                query = query.limit(limit)
             res = await query.execute()
             return getattr(res, "data")
         except Exception as e:
             logger.error(f"查询 {table} 失败: {e}")
             return None
 
-    async def _get_single_record(self, table: str, filters: dict) -> dict | None:
+    async def _get_single_record(
+        self, table: str, filters: dict, columns: str = "*"
+    ) -> dict | None:
         """
         通用方法：根据条件从指定表获取单条记录
 
         Args:
             table (str): 数据表名称
             filters (dict, optional): 查询条件，例如 {"contact_way": "telegram", "contact_number": "123"}
+            columns (str, optional): 要返回的列，默认返回全部列
 
         Returns:
             dict | None: 返回第一条记录，如果未找到返回 None
         """
-        records = await self._get_records(table, filters)
+        records = await self._get_records(table, filters, limit=1, columns=columns)
         return records[0] if records else None
 
+    async def get_user_role(self, way: str, number: str) -> str | None:
+        """
+        一次查询用户已注册的身份
+
+        Args:
+            way (str): 平台名称
+            number (str): 用户在该平台的唯一标识
+
+        Returns:
+            str | None: "adventurer" 或 "clienter"，未注册或查询失败返回 None
+        """
+        return await self._call_rpc("get_user_role", {"p_way": way, "p_number": number})
+
     # 冒险者相关
     async def get_adventurer_id_by_way_number(self, way: str, number: str) -> str | None:
+        key = (way, number)
+        adventurer_id = self._adventurer_id_cache.get(key)
+        if adventurer_id:
+            return adventurer_id
         rec = await self._get_single_record(
-            "adventurer", {"contact_way": way, "contact_number": number}
+            "adventurer", {"contact_way": way, "contact_number": number}, columns="id"
         )
-        return rec["id"] if rec else None
+        if not rec:
+            return None
+        self._adventurer_id_cache.set(key, rec["id"])
+        return rec["id"]
 
-    async def get_adventurer_by_way_number(self, way: str, number: str) -> Adventurer | None:
+    async def get_adventurer_id_status_by_way_number(
+        self, way: str, number: str
+    ) -> tuple[str, AdventurerStatus] | None:
+        """只查询冒险者的 id 和 status 两列"""
         rec = await self._get_single_record(
-            "adventurer", {"contact_way": way, "contact_number": number}
+            "adventurer",
+            {"contact_way": way, "contact_number": number},
+            columns="id,status",
         )
-        return Adventurer.from_dict(rec) if rec else None
+        if not rec:
+            return None
+        self._adventurer_id_cache.set((way, number), rec["id"])
+        return rec["id"], AdventurerStatus(rec["status"])
 
     async def get_adventurer_by_id(self, id: str) -> Adventurer | None:
         rec = await self._get_single_record("adventurer", {"id": id})
@@ -108,10 +178,17 @@ class SupabaseClient:
 
     # 委托人相关
     async def get_clienter_id_by_way_number(self, way: str, number: str) -> str | None:
+        key = (way, number)
+        clienter_id = self._clienter_id_cache.get(key)
+        if clienter_id:
+            return clienter_id
         rec = await self._get_single_record(
-            "clienter", {"contact_way": way, "contact_number": number}
+            "clienter", {"contact_way": way, "contact_number": number}, columns="id"
         )
-        return rec["id"] if rec else None
+        if not rec:
+            return None
+        self._clienter_id_cache.set(key, rec["id"])
+        return rec["id"]
 
     async def get_clienter_by_way_number(self, way: str, number: str) -> Clienter | None:
         rec = await self._get_single_record(
@@ -169,25 +246,15 @@ class SupabaseClient:
 
     async def get_available_quests(self) -> list[Quest] | None:
         """
-        获取所有可接取的任务（没有 ONGOING 状态的任务分配记录）
+        获取所有可接取的任务（没有执行中、已提交或已确认的任务分配记录）
+
+        反连接在数据库视图 available_quests 中完成，定义见 docs/database-schema.md。
 
         Returns:
             list[Quest] | None: 返回任务列表，如果没有找到返回 None
         """
-        # 获取所有 UNANSWERED 状态的任务分配记录
-        ongoing_assigns = await self.get_quest_assigns_by_status(QuestAssignStatus.UNANSWERED)
-
-        if not ongoing_assigns:
-            return None
-
-        # 获取对应的任务并转换为 Quest 对象
-        available_quests = []
-        for assign in ongoing_assigns:
-            quest_dict = await self._get_single_record("quest", {"id": assign.quest_id})
-            if quest_dict:
-                available_quests.append(Quest.from_dict(quest_dict))
-
-        return available_quests if available_quests else None
+        records = await self._get_records("available_quests", None)
+        return Quest.from_list(records) if records else None
 
     async def get_active_quest_assign_by_adventurer(
         self, adventurer_id: str
@@ -206,6 +273,39 @@ class SupabaseClient:
         )
         return QuestAssign.from_dict(rec) if rec else None
 
+    async def get_submit_context(
+        self, way: str, number: str
+    ) -> tuple[QuestAssign, Quest, Clienter | None] | None:
+        """
+        一次查询获取冒险者正在执行的分配记录、对应任务及其委托人
+
+        通过 PostgREST 资源嵌入完成 quest_assign -> quest -> clienter 的关联，
+        并以 adventurer!inner 按联系方式过滤冒险者。
+
+        Args:
+            way (str): 冒险者平台名称
+            number (str): 冒险者在该平台的唯一标识
+
+        Returns:
+            tuple[QuestAssign, Quest, Clienter | None] | None:
+                (分配记录, 任务, 委托人)；不是冒险者或没有执行中的任务返回 None
+        """
+        rec = await self._get_single_record(
+            "quest_assign",
+            {
+                "status": "ONGOING",
+                "adventurer.contact_way": way,
+                "adventurer.contact_number": number,
+            },
+            columns="*, quest(*, clienter(*)), adventurer!inner(id)",
+        )
+        if not rec or not rec.get("quest"):
+            return None
+        quest_rec = rec["quest"]
+        clienter_rec = quest_rec.get("clienter")
+        clienter = Clienter.from_dict(clienter_rec) if clienter_rec else None
+        return QuestAssign.from_dict(rec), Quest.from_dict(quest_rec), clienter
+
     async def get_quest_assigns_by_status(
         self, status: QuestAssignStatus
     ) -> list[QuestAssign] | None:
@@ -317,29 +417,39 @@ class SupabaseClient:
             return False
 
     # 冒险者相关
-    async def update_adventurer(self, adventurer: Adventurer) -> bool:
+    async def transition_adventurer_status(
+        self,
+        way: str,
+        number: str,
+        to_status: AdventurerStatus,
+        from_statuses: list[AdventurerStatus],
+    ) -> bool:
         """
-        更新冒险者信息到数据库
+        条件更新冒险者状态：仅当当前状态属于 from_statuses 时改为 to_status
+
+        检查与更新在一条 UPDATE 语句中完成，没有先读后写的竞态。
 
         Args:
-            adventurer (Adventurer): 需要更新的冒险者对象
+            way (str): 平台名称
+            number (str): 用户在该平台的唯一标识
+            to_status (AdventurerStatus): 目标状态
+            from_statuses (list[AdventurerStatus]): 允许转换的来源状态
 
         Returns:
-            bool: 更新成功返回 True，失败返回 False
+            bool: 有记录被更新返回 True，否则（不满足条件或更新失败）返回 False
         """
-        if not adventurer or not adventurer.id:
-            logger.error("无效冒险者对象，无法更新")
-            return False
         try:
             res = await (
                 self.client.table("adventurer")
-                .update(adventurer.to_dict())
-                .eq("id", adventurer.id)
+                .update({"status": to_status.value})
+                .eq("contact_way", way)
+                .eq("contact_number", number)
+                .in_("status", [s.value for s in from_statuses])
                 .execute()
             )
             return bool(getattr(res, "data", None))
         except Exception as e:
-            logger.error(f"更新冒险者 {adventurer.id} 失败: {e}")
+            logger.error(f"更新冒险者 {way}:{number} 状态失败: {e}")
             return False
 
     # 委托人相关
@@ -356,6 +466,8 @@ class SupabaseClient:
         if not clienter or not clienter.id:
             logger.error("无效委托人对象，无法更新")
             return False
+        # 联系方式可能被修改，先移除缓存的对应关系
+        self._clienter_id_cache.pop((clienter.contact_way, clienter.contact_number))
         try:
             res = await (
                 self.client.table("clienter")
@@ -408,6 +520,15 @@ class SupabaseClient:
         )
         return QuestAssign.from_dict(rec) if rec else None
 
+    async def get_quest_assign_by_quest_and_adventurer(
+        self, quest_id: str, adventurer_id: str
+    ) -> QuestAssign | None:
+        """获取某冒险者对某任务的分配记录"""
+        rec = await self._get_single_record(
+            "quest_assign", {"quest_id": quest_id, "adventurer_id": adventurer_id}
+        )
+        return QuestAssign.from_dict(rec) if rec else None
+
     async def get_quest_assigns_by_quest_id(self, quest_id: str) -> list[QuestAssign] | None:
         """获取某任务的所有分配历史"""
         records = await self._get_records("quest_assign", {"quest_id": quest_id})
@@ -435,6 +556,27 @@ class SupabaseClient:
             logger.error(f"插入任务材料失败: {e}")
             return False
 
+    async def insert_quest_materials(self, quest_materials: list[QuestMaterial]) -> bool:
+        """
+        批量插入任务材料记录，一次请求写入所有材料
+
+        Args:
+            quest_materials (list[QuestMaterial]): 待插入的任务材料对象列表
+
+        Returns:
+            bool: 插入成功返回 True，失败返回 False
+        """
+        try:
+            res = await (
+                self.client.table("quest_material")
+                .insert([m.to_dict() for m in quest_materials])
+                .execute()
+            )
+            return bool(getattr(res, "data", None))
+        except Exception as e:
+            logger.error(f"批量插入任务材料失败: {e}")
+            return False
+
     async def get_quest_materials_by_quest_id_type(
         self, quest_id: str, type: QuestMaterialType
     ) -> list[QuestMaterial] | None:
@@ -452,6 +594,146 @@ class SupabaseClient:
         )
         return QuestMaterial.from_list(records) if records else None
 
+    # ========================== rpc operations ==========================
+    async def _call_rpc(self, fn: str, params: dict):
+        """
+        通用方法：调用数据库存储过程（定义见 docs/database-schema.md）
+
+        Args:
+            fn (str): 存储过程名称
+            params (dict): 存储过程参数
+
+        Returns:
+            存储过程的返回值，调用失败返回 None
+        """
+        try:
+            res = await self.client.rpc(fn, params).execute()
+            return getattr(res, "data", None)
+        except Exception as e:
+            logger.error(f"调用存储过程 {fn} 失败: {e}")
+            return None
+
+    async def register_adventurer(
+        self, name: str, way: str, number: str
+    ) -> tuple[str, Adventurer | None] | None:
+        """
+        在一个事务内注册冒险者：检查联系方式未注册为委托人，并以
+        INSERT ... ON CONFLICT DO NOTHING 插入冒险者
+
+        Returns:
+            tuple[str, Adventurer | None] | None:
+                (状态, 新冒险者)，状态为 "ok"、"exists_adv" 或 "exists_cli"；调用失败返回 None
+        """
+        rec = await self._call_rpc(
+            "register_adventurer", {"p_name": name, "p_way": way, "p_number": number}
+        )
+        if not rec:
+            return None
+        row = rec.get("row")
+        adventurer = Adventurer.from_dict(row) if row else None
+        if adventurer:
+            self._adventurer_id_cache.set((way, number), adventurer.id)
+        return rec.get("status"), adventurer
+
+    async def register_clienter(
+        self, name: str, way: str, number: str
+    ) -> tuple[str, Clienter | None] | None:
+        """
+        在一个事务内注册委托人：检查联系方式未注册为冒险者，并以
+        INSERT ... ON CONFLICT DO NOTHING 插入委托人
+
+        Returns:
+            tuple[str, Clienter | None] | None:
+                (状态, 新委托人)，状态为 "ok"、"exists_adv" 或 "exists_cli"；调用失败返回 None
+        """
+        rec = await self._call_rpc(
+            "register_clienter", {"p_name": name, "p_way": way, "p_number": number}
+        )
+        if not rec:
+            return None
+        row = rec.get("row")
+        clienter = Clienter.from_dict(row) if row else None
+        if clienter:
+            self._clienter_id_cache.set((way, number), clienter.id)
+        return rec.get("status"), clienter
+
+    async def publish_quest(
+        self,
+        clienter_id: str,
+        title: str,
+        description: str | None,
+        reward: float,
+        deadline: datetime | None,
+    ) -> tuple[Quest, list[Adventurer]] | None:
+        """
+        发布任务并在同一次调用中取回当前空闲的冒险者
+
+        推送名单只包含 id、name、contact_way、contact_number，足够构建推送目标；
+        未返回的 status 按 IDLE 处理，created_at 为 None
+
+        Returns:
+            tuple[Quest, list[Adventurer]] | None: (新任务, 空闲冒险者列表)，失败返回 None
+        """
+        rec = await self._call_rpc(
+            "publish_quest",
+            {
+                "p_clienter_id": clienter_id,
+                "p_title": title,
+                "p_description": description,
+                "p_reward": reward,
+                "p_deadline": deadline.isoformat() if deadline else None,
+            },
+        )
+        if not rec:
+            return None
+        return Quest.from_dict(rec["quest"]), Adventurer.from_list(rec["idle_adventurers"])
+
+    async def accept_quest(self, quest_id: str, adventurer_id: str) -> Quest | None:
+        """
+        在一个事务内完成接取任务：锁定任务和冒险者行，检查任务未被接取且冒险者空闲，
+        创建 ONGOING 分配记录、将冒险者状态设为 WORKING 并记录系统日志
+
+        Returns:
+            Quest | None: 接取成功返回任务实例，任务不存在、已被接取或冒险者不空闲返回 None
+        """
+        rec = await self._call_rpc(
+            "accept_quest", {"p_quest_id": quest_id, "p_adventurer_id": adventurer_id}
+        )
+        return Quest.from_dict(rec) if rec else None
+
+    async def submit_quest(self, adventurer_id: str, quest_id: str) -> Quest | None:
+        """
+        在一个事务内完成提交任务：将冒险者该任务的 ONGOING 分配记录更新为 SUBMITTED
+        并记录系统日志
+
+        Returns:
+            Quest | None: 提交成功返回任务实例，否则返回 None
+        """
+        rec = await self._call_rpc(
+            "submit_quest", {"p_adventurer_id": adventurer_id, "p_quest_id": quest_id}
+        )
+        return Quest.from_dict(rec) if rec else None
+
+    async def confirm_quest(
+        self, clienter_id: str, quest_id: str
+    ) -> tuple[Quest, str, Adventurer | None] | None:
+        """
+        在一个事务内完成确认任务：将 SUBMITTED 分配记录更新为 CONFIRMED、
+        将冒险者状态恢复为 IDLE 并记录系统日志
+
+        Returns:
+            tuple[Quest, str, Adventurer | None] | None:
+                返回 (任务对象, 冒险者ID, 更新后的冒险者)；失败返回 None
+        """
+        rec = await self._call_rpc(
+            "confirm_quest", {"p_clienter_id": clienter_id, "p_quest_id": quest_id}
+        )
+        if not rec:
+            return None
+        adventurer_rec = rec.get("adventurer")
+        adventurer = Adventurer.from_dict(adventurer_rec) if adventurer_rec else None
+        return Quest.from_dict(rec["quest"]), rec["adventurer_id"], adventurer
+
     # ========================== system_log operations ==========================
     async def insert_system_log(self, log: SystemLog) -> bool:
         """插入系统日志"""
@@ -464,5 +746,5 @@ class SupabaseClient:
 
     async def log_event(self, event: str, detail: str | None = None) -> bool:
         """便捷方法：记录系统事件"""
-        log = SystemLog(event=event, detail=detail)
+        log = SystemLog(event=event, detail=detail, created_at=datetime.now())
         return await self.insert_system_log(log)
@@ -1,5 +1,6 @@
 """命令处理器类"""
 
+import asyncio
 import os
 from astrbot.api.event import AstrMessageEvent
 from astrbot.api import logger
@@ -14,6 +15,16 @@ from ..engine.association_client import AssociationClient
 from ..utils.message_utils import MessageUtils
 from ..utils.file_utils import FileUtils
 
+# 可作为任务附件保存的消息组件类型
+_ATTACHMENT_TYPES = frozenset(
+    (
+        ComponentType.File,
+        ComponentType.Image,
+        ComponentType.Video,
+        ComponentType.Record,
+    )
+)
+
 
 class CommandHandlers:
     """命令处理器类，处理用户命令"""
@@ -31,39 +42,40 @@ class CommandHandlers:
     async def create_adventurer(self, event: AstrMessageEvent):
         """注册为冒险者"""
         name, contact_way, contact_number = self.message_utils.get_user_identity(event)
-        if await self.ass_client.is_adventurer(
-            contact_way, contact_number
-        ) or await self.ass_client.is_clienter(contact_way, contact_number):
-            yield event.plain_result("您已经注册过了")
-            return
-
-        adventurer = await self.ass_client.register_adventurer(
+        # 已注册检查与插入在数据库端一次完成
+        result = await self.ass_client.register_adventurer(
             name, contact_way, contact_number
         )
-        if adventurer:
-            yield event.plain_result(
-                f"欢迎 {adventurer.name} 加入冒险家工会！🎉\n准备好迎接新的冒险吧！"
-            )
-        else:
+        if result is None:
             yield event.plain_result("注册失败，请稍后重试。")
+            return
+
+        status, adventurer = result
+        if status != "ok" or adventurer is None:
+            yield event.plain_result("您已经注册过了")
+            return
+        yield event.plain_result(
+            f"欢迎 {adventurer.name} 加入冒险家工会！🎉\n准备好迎接新的冒险吧！"
+        )
 
     async def create_clienter(self, event: AstrMessageEvent):
         """注册为委托人"""
         name, contact_way, contact_number = self.message_utils.get_user_identity(event)
-        # 检查是否已经注册为冒险者或委托人
-        if await self.ass_client.is_adventurer(
-            contact_way, contact_number
-        ) or await self.ass_client.is_clienter(contact_way, contact_number):
+        # 已注册为冒险者或委托人的检查与插入在数据库端一次完成
+        result = await self.ass_client.register_clienter(
+            name, contact_way, contact_number
+        )
+        if result is None:
+            yield event.plain_result("注册失败，请稍后重试。")
+            return
+
+        status, clienter = result
+        if status != "ok" or clienter is None:
             yield event.plain_result("您已经注册过了")
             return
-        # 调用 Clienter 注册方法
-        clienter = await self.ass_client.register_clienter(name, contact_way, contact_number)
-        if clienter:
-            yield event.plain_result(
-                f"欢迎 {name} 成为委托人！🎉\n您可以开始发布任务了。"
-            )
-        else:
-            yield event.plain_result("注册失败，请稍后重试。")
+        yield event.plain_result(
+            f"欢迎 {name} 成为委托人！🎉\n您可以开始发布任务了。"
+        )
 
     async def upload_attachments(self, event: AstrMessageEvent, quest_id: str):
         """文件上传具体实现"""
@@ -77,9 +89,10 @@ class CommandHandlers:
                 _, contact_way, contact_number = self.message_utils.get_user_identity(
                     event
                 )
-                if await self.ass_client.is_adventurer(contact_way, contact_number):
+                role = await self.ass_client.get_user_role(contact_way, contact_number)
+                if role == "adventurer":
                     type = QuestMaterialType.PROOF
-                elif await self.ass_client.is_clienter(contact_way, contact_number):
+                elif role == "clienter":
                     type = QuestMaterialType.ILLUSTRATE
                 else:
                     return
@@ -93,31 +106,27 @@ class CommandHandlers:
                 msg: AstrBotMessage = event.message_obj
                 messages: list[BaseMessageComponent] = msg.message
 
-                for message in messages:
-                    if message.type in [
-                        ComponentType.File,
-                        ComponentType.Image,
-                        ComponentType.Video,
-                        ComponentType.Record,
-                    ]:
-
-                        # 下载文件到quest文件夹
-                        file_path = await self.file_utils.download_user_file(
-                            f"quest_file/{quest_id}", message
+                attachments = [m for m in messages if m.type in _ATTACHMENT_TYPES]
+                if attachments:
+                    # 并发下载本条消息中的所有附件到 quest 文件夹
+                    quest_dir = f"quest_file/{quest_id}"
+                    file_paths = await asyncio.gather(
+                        *(
+                            self.file_utils.download_user_file(quest_dir, m)
+                            for m in attachments
                         )
-                        if file_path:
-                            # 保存到数据库
-                            qm = await self.ass_client.save_quest_attachment(
-                                quest_id,
-                                f"quest_file/{quest_id}",
-                                type,
-                            )
-                    # 只有在有文件上传时才发送确认消息
-                    message_result = event.make_result()
-                    message_result.chain = [
-                        Comp.Plain(f"已上传文件: {os.path.basename(file_path)}")
-                    ]
-                    await event.send(message_result)
+                    )
+                    file_paths = [p for p in file_paths if p]
+                    # 一次批量写入数据库
+                    await self.ass_client.save_quest_attachments(
+                        quest_id, [(p, type) for p in file_paths]
+                    )
+                    # 只有在有文件上传时才发送一条汇总确认消息
+                    if file_paths:
+                        names = ", ".join(os.path.basename(p) for p in file_paths)
+                        message_result = event.make_result()
+                        message_result.chain = [Comp.Plain(f"已上传文件: {names}")]
+                        await event.send(message_result)
 
                 controller.keep(timeout=60, reset_timeout=True)
 
@@ -1,6 +1,7 @@
 """LLM 工具处理器类"""
 
 from datetime import datetime
+from functools import lru_cache
 
 from astrbot.api.event import AstrMessageEvent
 from astrbot.api import logger
@@ -8,9 +9,57 @@ from astrbot.api import logger
 from ..engine.supa_client import SupabaseClient
 from ..engine.association_client import AssociationClient
 from ..domain.status import AdventurerStatus
-from ..domain.vo import Quest
 from ..utils.message_utils import MessageUtils
 
+# 回复与通知模板
+_PUBLISH_OK_TMPL = "任务《{title}》发布成功，id：{id}，正在推送给空闲的冒险者。"
+_PUBLISH_NO_IDLE_TMPL = "任务《{title}》发布成功，id：{id}，当前没有空闲的冒险者可推送。"
+_SUBMIT_NOTICE_TMPL = "🔔 任务通知\n\n{quest_text} \n已由冒险者提交完成。\n请及时确认。"
+_SUBMIT_OK_TMPL = "✅ 任务《{title}》已成功提交！\nid: {id}\n📨 已通知委托人确认。"
+_CONFIRM_NO_ADVENTURER_TMPL = "🎉 任务《{title}》已确认完成，但冒险者信息缺失。"
+_CONFIRM_NOTICE_TMPL = (
+    "🎉 恭喜！\n"
+    "你提交的任务《{title}》\n"
+    "✨ 已被委托人确认完成！\n"
+    "你的状态已恢复为【空闲】，可以继续接取新任务啦！"
+)
+_CONFIRM_OK_TMPL = "🎉 任务《{title}》已成功确认完成！\n✨ 感谢使用冒险者公会系统。"
+
+
+# 冒险者状态切换的回复：目标状态 -> 切换成功的回复
+_TRANSITION_OK = {
+    AdventurerStatus.REST: "已完成修改，享受假期吧冒险者！",
+    AdventurerStatus.IDLE: "状态已恢复为空闲，可以接取任务了！",
+    AdventurerStatus.QUIT: "您已成功退出冒险者公会，每天都是假期！",
+}
+# (目标状态, 当前状态) -> 未切换时的回复；当前状态本可切换说明是写入失败
+_TRANSITION_REFUSED = {
+    (AdventurerStatus.REST, AdventurerStatus.IDLE): "状态修改失败，请稍后重试。",
+    (AdventurerStatus.REST, AdventurerStatus.WORKING): "您还有任务在身！",
+    (AdventurerStatus.REST, AdventurerStatus.REST): "您已经在休息了。",
+    (AdventurerStatus.REST, AdventurerStatus.QUIT): "您已经不是冒险者了，每天都是假期！",
+    (AdventurerStatus.IDLE, AdventurerStatus.IDLE): "您已经是空闲状态，可以接取任务。",
+    (AdventurerStatus.IDLE, AdventurerStatus.WORKING): "状态恢复失败，请稍后重试。",
+    (AdventurerStatus.IDLE, AdventurerStatus.REST): "状态恢复失败，请稍后重试。",
+    (AdventurerStatus.IDLE, AdventurerStatus.QUIT): "您已退出冒险者公会，无法恢复为空闲。",
+    (AdventurerStatus.QUIT, AdventurerStatus.IDLE): "退出操作失败，请稍后重试。",
+    (AdventurerStatus.QUIT, AdventurerStatus.WORKING): "退出操作失败，请稍后重试。",
+    (AdventurerStatus.QUIT, AdventurerStatus.REST): "退出操作失败，请稍后重试。",
+    (AdventurerStatus.QUIT, AdventurerStatus.QUIT): "您已经退出了冒险者公会。",
+}
+
+
+@lru_cache(maxsize=1024)
+def _parse_deadline(deadline: str) -> datetime | None:
+    """解析 ISO 格式的截止时间，格式错误返回 None；LLM 重试时复用解析结果"""
+    # Python 3.11 之前的 fromisoformat 不接受 UTC 后缀 "Z"
+    if deadline[-1:] in ("Z", "z"):
+        deadline = deadline[:-1] + "+00:00"
+    try:
+        return datetime.fromisoformat(deadline)
+    except ValueError:
+        return None
+
 
 class LLMHandlers:
     """LLM 工具处理器类，处理所有 LLM 工具调用"""
@@ -43,35 +92,31 @@ class LLMHandlers:
         """
         _, contact_way, contact_number = self.message_utils.get_user_identity(event)
 
-        if not await self.ass_client.is_clienter(contact_way, contact_number):
-            return "您还不是委托人，无法发布任务，请先注册。"
-
         deadline_dt: datetime | None = None
         if deadline:
-            try:
-                deadline_dt = datetime.fromisoformat(deadline)
-            except ValueError:
+            deadline_dt = _parse_deadline(deadline)
+            if deadline_dt is None:
                 return "截止时间格式错误，请使用 ISO 格式，如 2025-12-31T23:59:59"
 
-        clienter = await self.supa_client.get_clienter_by_way_number(
+        # 委托人 ID 有缓存，通常不产生网络请求
+        clienter_id = await self.supa_client.get_clienter_id_by_way_number(
             contact_way, contact_number
         )
-        if not clienter:
-            return "未找到您的委托人信息，请重新注册。"
+        if not clienter_id:
+            return "您还不是委托人，无法发布任务，请先注册。"
 
-        quest = await self.ass_client.register_quest(
-            clienter.id, title, description, reward, deadline_dt
+        result = await self.ass_client.publish_quest(
+            clienter_id, title, description, reward, deadline_dt
         )
-        if not quest:
+        if not result:
             return "任务发布失败，请稍后重试。"
 
-        adventurers = await self.supa_client.get_adventurers_by_status(AdventurerStatus.IDLE)
-        if adventurers:
-            quest_text = Quest.format_quests([quest])
-            await self.message_utils.send_message_to_users(adventurers, quest_text)
-        return (
-            f"任务《{quest.title}》发布成功，id：{quest.id}，并已推送给空闲的冒险者。"
-        )
+        quest, adventurers = result
+        if not adventurers:
+            return _PUBLISH_NO_IDLE_TMPL.format(title=quest.title, id=quest.id)
+        # 推送在后台进行，发布结果立即返回
+        self.message_utils.dispatch_message_to_users(adventurers, quest.format_quest())
+        return _PUBLISH_OK_TMPL.format(title=quest.title, id=quest.id)
 
     async def fetch_quests_published(self, event: AstrMessageEvent) -> str:
         """获取所有已发布且可供冒险者接取的任务列表。
@@ -79,13 +124,14 @@ class LLMHandlers:
         Args:
         """
         _, way, number = self.message_utils.get_user_identity(event)
-        adventurer = await self.supa_client.get_adventurer_by_way_number(way, number)
-        if not adventurer or adventurer.status != AdventurerStatus.IDLE:
+        adv = await self.ass_client.get_adventurer_id_and_status(way, number)
+        if not adv or adv[1] != AdventurerStatus.IDLE:
             return "您现在貌似还有任务没有完成，或者您并未注册为冒险者。"
-        quests = await self.supa_client.get_available_quests()
-        if not quests:
+        # 列表文本在冒险者之间共享缓存，空闲状态检查是按用户的，放在缓存之外
+        text = await self.ass_client.get_available_quests_text()
+        if not text:
             return "当前没有可接取的任务。"
-        return Quest.format_quests(quests)
+        return text
 
     async def accept_task(self, event: AstrMessageEvent, quest_id: str) -> str:
         """接取一项冒险者协会已发布的任务。
@@ -94,25 +140,24 @@ class LLMHandlers:
             quest_id(string): 要接取的委托任务的唯一标识符（UUID）
         """
         _, contact_way, contact_number = self.message_utils.get_user_identity(event)
-        if not await self.ass_client.is_adventurer(contact_way, contact_number):
-            return "你还不是冒险者"
-
-        status = await self.ass_client.get_adventurer_status_by_id(
-            contact_way, contact_number
-        )
-        if status != AdventurerStatus.IDLE:
-            return "你已经接取了其他任务"
-
+        # 冒险者 ID 有缓存；空闲状态由存储过程在事务内校验，无需预先查询
         adv_id = await self.supa_client.get_adventurer_id_by_way_number(
             contact_way, contact_number
         )
         if not adv_id:
-            return "无法获取冒险者ID，请重试"
+            return "你还不是冒险者"
 
         quest = await self.ass_client.accept_quest_by_id(quest_id, adv_id)
-        if not quest:
-            return "任务接取失败，可能已被其他人接取或任务不存在"
-        return Quest.format_quests([quest])
+        if quest:
+            return quest.format_quest()
+
+        # 接取失败时再查询状态，区分失败原因
+        result = await self.ass_client.get_adventurer_id_and_status(
+            contact_way, contact_number
+        )
+        if result and result[1] != AdventurerStatus.IDLE:
+            return "你已经接取了其他任务"
+        return "任务接取失败，可能已被其他人接取或任务不存在"
 
     async def submit_quest(self, event: AstrMessageEvent) -> str:
         """冒险者提交当前正在执行的任务。
@@ -120,33 +165,32 @@ class LLMHandlers:
         Args:
         """
         _, way, number = self.message_utils.get_user_identity(event)
-        adventurer = await self.supa_client.get_adventurer_by_way_number(way, number)
-        if not adventurer:
-            return "❌ 你还不是冒险者，无法提交任务。"
-        if adventurer.status != AdventurerStatus.WORKING:
+        # 一次查询拿到分配记录、任务和委托人
+        ctx = await self.supa_client.get_submit_context(way, number)
+        if not ctx:
+            # 仅在失败时区分原因；冒险者 ID 有缓存
+            if not await self.supa_client.get_adventurer_id_by_way_number(way, number):
+                return "❌ 你还不是冒险者，无法提交任务。"
             return "❌ 你当前没有正在进行的任务。"
 
-        result = await self.ass_client.get_running_quest_by_adventurer_id(adventurer.id)
-        if not result:
-            return "❌ 未找到你正在执行的任务。"
-
-        quest, quest_assign = result
+        quest_assign, quest, clienter = ctx
 
         if not quest.clienter_id:
             return "❌ 未找到委托人。"
-        clienter = await self.supa_client.get_clienter_by_id(quest.clienter_id)
         if not clienter:
             return "⚠️ 任务已提交，但未找到委托人。"
 
-        updated_quest = await self.ass_client.submit_quest(adventurer.id, quest.id)
+        updated_quest = await self.ass_client.submit_quest(
+            quest_assign.adventurer_id, quest.id
+        )
         if not updated_quest:
             return "❌ 任务提交失败，请检查状态或权限。"
 
-        await self.message_utils.send_message_to_users(
+        self.message_utils.dispatch_message_to_users(
             [clienter],
-            f"🔔 任务通知\n\n{Quest.format_quests([quest])} \n已由冒险者提交完成。\n请及时确认。",
+            _SUBMIT_NOTICE_TMPL.format(quest_text=quest.format_quest()),
         )
-        return f"✅ 任务《{quest.title}》已成功提交！\nid: {quest.id}\n📨 已通知委托人确认。"
+        return _SUBMIT_OK_TMPL.format(title=quest.title, id=quest.id)
 
     async def confirm_quest(self, event: AstrMessageEvent, quest_id: str) -> str:
         """委托人确认任务完成。
@@ -165,88 +209,60 @@ class LLMHandlers:
         if not result:
             return "❌ 任务确认失败，请检查任务状态或权限。"
 
-        quest, adventurer_id = result
-
-        adventurer = await self.supa_client.get_adventurer_by_id(adventurer_id)
+        # 存储过程已一并返回冒险者，无需再次查询
+        quest, adventurer_id, adventurer = result
         if not adventurer:
             logger.warning(f"任务 {quest_id} 已确认，但冒险者 {adventurer_id} 不存在？")
-            return f"🎉 任务《{quest.title}》已确认完成，但冒险者信息缺失。"
+            return _CONFIRM_NO_ADVENTURER_TMPL.format(title=quest.title)
 
-        await self.message_utils.send_message_to_users(
+        self.message_utils.dispatch_message_to_users(
             [adventurer],
-            f"🎉 恭喜！\n"
-            f"你提交的任务《{quest.title}》\n"
-            f"✨ 已被委托人确认完成！\n"
-            f"你的状态已恢复为【空闲】，可以继续接取新任务啦！",
+            _CONFIRM_NOTICE_TMPL.format(title=quest.title),
         )
-        return f"🎉 任务《{quest.title}》已成功确认完成！\n✨ 感谢使用冒险者公会系统。"
+        return _CONFIRM_OK_TMPL.format(title=quest.title)
 
     async def adventurer_rest(self, event: AstrMessageEvent) -> str:
         """冒险者暂时不接取任务，享受假期。
 
         Args:
         """
-        _, way, number = self.message_utils.get_user_identity(event)
-        adv = await self.supa_client.get_adventurer_by_way_number(way, number)
-        if not adv:
-            return "未找到您的冒险者信息。"
-
-        if adv.status == AdventurerStatus.IDLE:
-            adv.status = AdventurerStatus.REST
-            if await self.supa_client.update_adventurer(adv):
-                return "已完成修改，享受假期吧冒险者！"
-            else:
-                return "状态修改失败，请稍后重试。"
-        elif adv.status == AdventurerStatus.WORKING:
-            return "您还有任务在身！"
-        elif adv.status == AdventurerStatus.QUIT:
-            return "您已经不是冒险者了，每天都是假期！"
-        elif adv.status == AdventurerStatus.REST:
-            return "您已经在休息了。"
-
-        return "状态异常，请联系管理员。"
+        return await self._transition_adventurer(event, AdventurerStatus.REST)
 
     async def adventurer_idle(self, event: AstrMessageEvent) -> str:
         """将冒险者状态设置为空闲，可接取任务。
 
         Args:
         """
-        _, way, number = self.message_utils.get_user_identity(event)
-        adv = await self.supa_client.get_adventurer_by_way_number(way, number)
-        if not adv:
-            return "未找到您的冒险者信息。"
-
-        if adv.status == AdventurerStatus.IDLE:
-            return "您已经是空闲状态，可以接取任务。"
-        elif adv.status in [AdventurerStatus.WORKING, AdventurerStatus.REST]:
-            adv.status = AdventurerStatus.IDLE
-            if await self.supa_client.update_adventurer(adv):
-                return "状态已恢复为空闲，可以接取任务了！"
-            else:
-                return "状态恢复失败，请稍后重试。"
-        elif adv.status == AdventurerStatus.QUIT:
-            return "您已退出冒险者公会，无法恢复为空闲。"
-
-        return "状态异常，请联系管理员。"
+        return await self._transition_adventurer(event, AdventurerStatus.IDLE)
 
     async def adventurer_quit(self, event: AstrMessageEvent) -> str:
         """将冒险者状态设置为退出，不再接取任务。
 
         Args:
         """
+        return await self._transition_adventurer(event, AdventurerStatus.QUIT)
+
+    async def _transition_adventurer(
+        self, event: AstrMessageEvent, target: AdventurerStatus
+    ) -> str:
+        """切换冒险者状态，并按查表结果返回回复
+
+        Args:
+            event: 消息事件对象
+            target: 目标状态
+
+        Returns:
+            str: 回复文本
+        """
         _, way, number = self.message_utils.get_user_identity(event)
-        adv = await self.supa_client.get_adventurer_by_way_number(way, number)
-        if not adv:
+        changed, status = await self.ass_client.transition_adventurer_status(
+            way, number, target
+        )
+        if changed:
+            return _TRANSITION_OK[target]
+        if status is None:
             return "未找到您的冒险者信息。"
-
-        if adv.status == AdventurerStatus.QUIT:
-            return "您已经退出了冒险者公会。"
-        else:
-            adv.status = AdventurerStatus.QUIT
-            if await self.supa_client.update_adventurer(adv):
-                return "您已成功退出冒险者公会，每天都是假期！"
-            else:
-                return "退出操作失败，请稍后重试。"
+        return _TRANSITION_REFUSED.get((target, status), "状态异常，请联系管理员。")
 
     async def test(self, event: AstrMessageEvent) -> str:
         """测试 LLM 工具函数。
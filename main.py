@@ -15,10 +15,14 @@ from .engine.association_client import AssociationClient
 from .utils.message_utils import MessageUtils
 from .utils.file_utils import FileUtils
 from .utils.session_manager import SessionManager
+from .utils.ttl_cache import TTLCache
 from .handlers.command_handlers import CommandHandlers
 from .handlers.llm_handlers import LLMHandlers
 from .handlers.event_handlers import EventHandlers
 
+# 事件 extras 中缓存专属对话 ID 的键
+_GUILD_CID_EXTRA_KEY = "association_guild_cid"
+
 
 # todo https://github.com/AstrBotDevs/AstrBot/issues/4108#issuecomment-3669179542
 @register("astrbot_plugin_association", "Orlando", "成为冒险者或成为委托人", "1.0.0")
@@ -29,6 +33,8 @@ class AssociationPlugin(Star):
         super().__init__(context)
         self.context = context
         self.config = config
+        # umo -> 已验证存在的专属对话 ID，短时间内不再重复校验
+        self._verified_cids = TTLCache(maxsize=4096, ttl=300)
 
     async def initialize(self):
         """初始化插件，创建所有处理器实例"""
@@ -43,7 +49,9 @@ class AssociationPlugin(Star):
         self.ass_client = AssociationClient(self.supa_client)
 
         # 初始化工具类
-        self.session_manager = SessionManager(self.save_dir)
+        self.session_manager = SessionManager(
+            self.save_dir, persist=self.config.get("persist_sessions", True)
+        )
         self.message_utils = MessageUtils(
             self.context, self.config, self.session_manager
         )
@@ -64,12 +72,14 @@ class AssociationPlugin(Star):
 
     async def terminate(self):
         """插件销毁方法"""
-        pass
+        await self.message_utils.aclose()
+        await self.session_manager.aclose()
+        await self.supa_client.close()
 
     # ==================== 对话管理辅助方法 ====================
 
     async def _ensure_guild_conversation(
-        self, event: AstrMessageEvent
+        self, event: AstrMessageEvent, persona_id: str | None = None
     ) -> tuple[bool, str]:
         """确保用户在冒险者工会专属对话中
 
@@ -78,17 +88,26 @@ class AssociationPlugin(Star):
 
         Args:
             event: 消息事件对象
+            persona_id: 新建对话时使用的人格 ID，已有对话时忽略
 
         Returns:
             tuple[bool, str]: (is_first_time, conversation_id)
                 - is_first_time: 是否是首次创建专属对话
                 - conversation_id: 对话 ID
         """
+        # 同一事件内已确认过专属对话，直接复用
+        cached_cid = event.get_extra(_GUILD_CID_EXTRA_KEY)
+        if cached_cid:
+            return False, cached_cid
+
         try:
             umo = event.unified_msg_origin
 
             # 检查是否已有插件专属的 conversation
             existing_cid = self.session_manager.get_user_conversation(umo)
+            if existing_cid and self._verified_cids.get(umo) == existing_cid:
+                event.set_extra(_GUILD_CID_EXTRA_KEY, existing_cid)
+                return False, existing_cid
             if existing_cid:
                 # 验证这个 conversation 是否还存在
                 try:
@@ -98,28 +117,32 @@ class AssociationPlugin(Star):
                         )
                     )
                     if conversation:
+                        self._verified_cids.set(umo, existing_cid)
+                        event.set_extra(_GUILD_CID_EXTRA_KEY, existing_cid)
                         return False, existing_cid
                 except Exception:
                     logger.warning(
                         f"用户 {umo} 的专属对话 {existing_cid} 不存在，将创建新对话"
                     )
 
-            # 创建新的插件专属 conversation
+            # 创建新的插件专属 conversation，人格在创建时一并设置；
+            # new_conversation 会同时把会话切换到这个新对话
             new_cid = await self.context.conversation_manager.new_conversation(
                 umo,
                 event.get_platform_id(),
                 title="冒险者工会",
+                persona_id=persona_id,
             )
 
             # 保存到 SessionManager
             self.session_manager.set_user_conversation(umo, new_cid)
-
-            # 切换到这个新对话
-            await self.context.conversation_manager.switch_conversation(umo, new_cid)
+            self._verified_cids.set(umo, new_cid)
 
             logger.info(f"为用户 {umo} 创建了冒险者工会专属对话: {new_cid[:8]}...")
+            event.set_extra(_GUILD_CID_EXTRA_KEY, new_cid)
             return True, new_cid
         except Exception as e:
+            self._verified_cids.pop(event.unified_msg_origin)
             logger.error(f"创建/获取用户专属 conversation 失败: {e}")
             return False, ""
 
@@ -144,16 +167,11 @@ class AssociationPlugin(Star):
     @filter.command("我要当冒险者")
     async def create_adventurer(self, event: AstrMessageEvent):
         """注册为冒险者"""
-        is_first_time, cid = await self._ensure_guild_conversation(event)
+        # 首次创建专属对话时设置冒险者人格
+        is_first_time, cid = await self._ensure_guild_conversation(
+            event, self.config.get("adventurer_personality_id", None)
+        )
         if is_first_time:
-            # 设置冒险者人格
-            adventurer_personality_id = self.config.get(
-                "adventurer_personality_id", None
-            )
-            if adventurer_personality_id:
-                await self.context.conversation_manager.update_conversation(
-                    event.unified_msg_origin, cid, persona_id=adventurer_personality_id
-                )
             yield event.plain_result(self._create_first_time_notice(cid))
         async for result in self.command_handlers.create_adventurer(event):
             yield result
@@ -161,14 +179,11 @@ class AssociationPlugin(Star):
     @filter.command("我要成为委托人")
     async def create_clienter(self, event: AstrMessageEvent):
         """注册为委托人"""
-        is_first_time, cid = await self._ensure_guild_conversation(event)
+        # 首次创建专属对话时设置委托人人格
+        is_first_time, cid = await self._ensure_guild_conversation(
+            event, self.config.get("clienter_personality_id", None)
+        )
         if is_first_time:
-            # 设置委托人人格
-            clienter_personality_id = self.config.get("clienter_personality_id", None)
-            if clienter_personality_id:
-                await self.context.conversation_manager.update_conversation(
-                    event.unified_msg_origin, cid, persona_id=clienter_personality_id
-                )
             yield event.plain_result(self._create_first_time_notice(cid))
         async for result in self.command_handlers.create_clienter(event):
             yield result
@@ -1,7 +1,9 @@
 """文件处理工具类"""
 
+import asyncio
 import os
 import shutil
+import uuid
 from pathlib import Path
 from astrbot.api import logger
 from astrbot.core.message.components import File, Image, Video, Record
@@ -12,6 +14,17 @@ class FileUtils:
 
     def __init__(self, save_dir: str | Path):
         self.save_dir = save_dir
+        # 目标路径均由该绝对路径拼接并在构建时规范化，复制前可直接与源路径比较
+        self._save_dir_abs = os.path.abspath(save_dir)
+        # 已确认存在的目录，避免每次保存文件都调用 makedirs
+        self._created_dirs: set[str] = set()
+        # 组件类型 -> 获取 (源文件路径, 文件名) 的方法
+        self._source_resolvers = {
+            File: self._resolve_file,
+            Image: self._resolve_media,
+            Video: self._resolve_media,
+            Record: self._resolve_media,
+        }
 
     async def download_user_file(
         self, path: str, file_component: File | Image | Video | Record
@@ -29,36 +42,100 @@ class FileUtils:
         """
         try:
             # 构建用户文件夹路径
-            user_dir = os.path.join(self.save_dir, path)
-            os.makedirs(user_dir, exist_ok=True)
+            user_dir = os.path.normpath(os.path.join(self._save_dir_abs, path))
 
             # 根据组件类型获取源文件路径
-            if isinstance(file_component, File):
-                # File 类型使用 get_file() 方法
-                source_path = await file_component.get_file()
-                file_name = file_component.name or os.path.basename(source_path)
-            elif isinstance(file_component, (Image, Video, Record)):
-                # Image, Video, Record 类型使用 convert_to_file_path() 方法
-                source_path = await file_component.convert_to_file_path()
-                # 从源路径提取文件名，或使用默认命名
-                file_name = os.path.basename(source_path)
-            else:
+            resolver = self._source_resolvers.get(type(file_component))
+            if resolver is None:
                 logger.error(f"不支持的文件组件类型: {type(file_component)}")
                 return None
+            source_path, file_name = await resolver(file_component)
 
-            if not source_path or not os.path.exists(source_path):
+            if not source_path:
                 logger.error(f"源文件不存在: {source_path}")
                 return None
 
             # 构建目标文件路径
-            dest_path = os.path.join(user_dir, file_name)
+            dest_path = os.path.normpath(os.path.join(user_dir, file_name))
 
-            # 如果源路径和目标路径不同，则复制文件
-            if os.path.abspath(source_path) != os.path.abspath(dest_path):
-                shutil.copy2(source_path, dest_path)
+            # 磁盘读写在线程中执行，避免阻塞事件循环
+            if not await asyncio.to_thread(
+                self._copy_file, source_path, user_dir, dest_path
+            ):
+                logger.error(f"源文件不存在: {source_path}")
+                return None
 
             logger.info(f"文件已保存: {file_name} -> {dest_path}")
             return dest_path
         except Exception as e:
             logger.error(f"文件下载失败: {e}")
             return None
+
+    @staticmethod
+    async def _resolve_file(file_component: File) -> tuple[str, str]:
+        """File 类型使用 get_file() 方法获取源文件"""
+        source_path = await file_component.get_file()
+        return source_path, file_component.name or os.path.basename(source_path)
+
+    @staticmethod
+    async def _resolve_media(
+        file_component: Image | Video | Record,
+    ) -> tuple[str, str]:
+        """Image, Video, Record 类型使用 convert_to_file_path() 方法，从源路径提取文件名"""
+        source_path = await file_component.convert_to_file_path()
+        return source_path, os.path.basename(source_path)
+
+    def _copy_file(self, source_path: str, user_dir: str, dest_path: str) -> bool:
+        """将源文件复制到目标路径，源文件不存在时返回 False"""
+        if not os.path.exists(source_path):
+            return False
+        if user_dir not in self._created_dirs:
+            os.makedirs(user_dir, exist_ok=True)
+            self._created_dirs.add(user_dir)
+        # 如果源路径和目标路径不同，则复制文件
+        if os.path.abspath(source_path) != dest_path:
+            FileUtils._fast_copy(source_path, dest_path)
+        return True
+
+    @staticmethod
+    def _fast_copy(source_path: str, dest_path: str) -> None:
+        """复制文件，同一文件系统上优先创建硬链接
+
+        收到的媒体文件不会再被修改，硬链接只需一次元数据操作。
+        目标已是同一文件时直接返回；目标是其他文件时先在临时路径创建新文件再原子替换，
+        不会写入旧目标的 inode（它可能与另一个源文件共享）。
+        跨文件系统或文件系统不支持硬链接时回退到 shutil.copy2
+        （Linux 上内部使用 sendfile，不经过用户态缓冲）。
+        """
+        try:
+            os.link(source_path, dest_path)
+            return
+        except FileExistsError:
+            if os.path.samefile(source_path, dest_path):
+                return
+            use_link = True
+        except OSError as e:
+            logger.debug(f"硬链接失败，改为复制文件: {e}")
+            use_link = False
+        FileUtils._replace_file(source_path, dest_path, use_link)
+
+    @staticmethod
+    def _replace_file(source_path: str, dest_path: str, use_link: bool) -> None:
+        """在目标目录的临时路径上链接或复制源文件，再原子替换目标路径"""
+        tmp_path = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            if use_link:
+                try:
+                    os.link(source_path, tmp_path)
+                except OSError as e:
+                    logger.debug(f"硬链接失败，改为复制文件: {e}")
+                    shutil.copy2(source_path, tmp_path)
+            else:
+                shutil.copy2(source_path, tmp_path)
+            os.replace(tmp_path, dest_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
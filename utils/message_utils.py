@@ -1,6 +1,8 @@
 """消息处理工具类"""
 
-import json
+import asyncio
+from collections import Counter
+import logging
 from typing import List, Union
 from astrbot.api.event import AstrMessageEvent, MessageEventResult
 from astrbot.api.star import Context
@@ -10,6 +12,9 @@ from astrbot.core.config.astrbot_config import AstrBotConfig
 from ..domain.vo import Adventurer, Clienter
 from .session_manager import SessionManager
 
+# 事件 extras 中缓存用户身份的键
+_IDENTITY_EXTRA_KEY = "association_identity"
+
 
 class MessageUtils:
     """消息处理工具类
@@ -30,6 +35,17 @@ class MessageUtils:
         self.context = context
         self.config = config
         self.session_manager = session_manager
+        # 平台 -> UMO 前缀，配置只读取一次，每个用户只需一次拼接
+        self._umo_prefixes = {
+            "telegram": f"{config.get('telegram_id')}:FriendMessage:",
+            "aiocqhttp": f"{config.get('aiocqhttp_id')}:FriendMessage:",
+        }
+        # 限制同时进行的主动推送数量，避免冲击消息平台
+        self._send_semaphore = asyncio.Semaphore(
+            max(1, int(config.get("push_concurrency", 16) or 16))
+        )
+        # 后台推送任务的引用，防止任务在完成前被回收
+        self._background_tasks: set[asyncio.Task] = set()
 
     @staticmethod
     def get_user_identity(event: AstrMessageEvent) -> tuple[str, str, str]:
@@ -41,10 +57,16 @@ class MessageUtils:
         Returns:
             tuple[str, str, str]: (name, contact_way, contact_number)
         """
-        name = event.get_sender_name()
-        contact_way = event.get_platform_name()
-        contact_number = event.get_sender_id()
-        return name, contact_way, contact_number
+        # 同一事件内多次调用时直接复用首次解析的结果
+        identity = event.get_extra(_IDENTITY_EXTRA_KEY)
+        if identity is None:
+            identity = (
+                event.get_sender_name(),
+                event.get_platform_name(),
+                event.get_sender_id(),
+            )
+            event.set_extra(_IDENTITY_EXTRA_KEY, identity)
+        return identity
 
     async def send_message_to_users(
         self, users: List[Union[Adventurer, Clienter]], message: str
@@ -57,26 +79,77 @@ class MessageUtils:
             users: 用户对象列表，每个用户需包含 contact_way, contact_number, name 属性
             message: 需要发送的消息文本
         """
-        for user in users:
-            await self._send_message_to_single_user(user, message)
+        if not users:
+            return
+        # return_exceptions=True：单个用户发送异常不会取消其余发送
+        results = await asyncio.gather(
+            *(self._send_message_limited(user, message) for user in users),
+            return_exceptions=True,
+        )
+        sent: list[Union[Adventurer, Clienter]] = []
+        for user, result in zip(users, results):
+            if isinstance(result, Exception):
+                logger.error(f"发送消息给 {getattr(user, 'name', None)} 失败: {result}")
+            elif result:
+                sent.append(user)
+        # 整批只输出一条汇总日志，失败已在上面逐条记录
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "消息群发完成: 成功 %d，失败 %d，平台分布 %s",
+                len(sent),
+                len(users) - len(sent),
+                dict(Counter(u.contact_way for u in sent)),
+            )
+
+    def dispatch_message_to_users(
+        self, users: List[Union[Adventurer, Clienter]], message: str
+    ) -> None:
+        """在后台将消息发送给用户列表，不等待发送完成
+
+        Args:
+            users: 用户对象列表
+            message: 需要发送的消息文本
+        """
+        task = asyncio.create_task(self.send_message_to_users(users, message))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def aclose(self) -> None:
+        """取消尚未完成的后台推送任务并等待其结束"""
+        tasks = list(self._background_tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.info("已取消 %d 个未完成的后台推送任务", len(tasks))
+
+    async def _send_message_limited(
+        self, user: Union[Adventurer, Clienter], message: str
+    ) -> bool:
+        """在并发上限内向单个用户发送消息，返回是否发送成功"""
+        async with self._send_semaphore:
+            return await self._send_message_to_single_user(user, message)
 
     async def _send_message_to_single_user(
         self, user: Union[Adventurer, Clienter], message: str
-    ) -> None:
+    ) -> bool:
         """向单个用户发送消息
 
         Args:
             user: 用户对象
             message: 消息文本
+
+        Returns:
+            bool: 消息是否发送成功
         """
         # 验证用户信息完整性
         if not self._validate_user_contact_info(user):
-            return
+            return False
 
         # 构建统一消息来源标识符
         umo = self._build_unified_message_origin(user)
         if not umo:
-            return
+            return False
 
         try:
             # 获取用户的专属对话 ID
@@ -89,12 +162,13 @@ class MessageUtils:
             await self.context.send_message(
                 umo, MessageEventResult().message(full_message)
             )
-            logger.info(f"消息已发送给 {user.name} via {user.contact_way}")
 
             # 记录到对话历史（仅记录原始消息）
             await self._record_message_to_conversation(umo, message)
+            return True
         except Exception as e:
             logger.error(f"发送消息给 {user.name} 失败: {e}")
+            return False
 
     def _validate_user_contact_info(self, user: Union[Adventurer, Clienter]) -> bool:
         """验证用户联系方式信息是否完整
@@ -105,9 +179,7 @@ class MessageUtils:
         Returns:
             bool: 信息是否完整
         """
-        return bool(
-            getattr(user, "contact_way", None) and getattr(user, "contact_number", None)
-        )
+        return bool(user.contact_way and user.contact_number)
 
     def _build_unified_message_origin(
         self, user: Union[Adventurer, Clienter]
@@ -120,11 +192,8 @@ class MessageUtils:
         Returns:
             str | None: UMO 字符串，格式为 "platform_id:MessageType:user_id"
         """
-        platform_mapping = {
-            "telegram": f"{self.config.get('telegram_id')}:FriendMessage:{user.contact_number}",
-            "aiocqhttp": f"{self.config.get('aiocqhttp_id')}:FriendMessage:{user.contact_number}",
-        }
-        return platform_mapping.get(user.contact_way)
+        prefix = self._umo_prefixes.get(user.contact_way)
+        return prefix + str(user.contact_number) if prefix else None
 
     def _build_message_with_switch_notice(
         self, message: str, conversation_id: str | None
@@ -202,18 +271,15 @@ class MessageUtils:
             cid: 对话 ID
             message: 消息内容
         """
-        # 获取对话详情
-        conversation = await self.context.conversation_manager.get_conversation(
-            umo, cid
-        )
+        # 直接读取数据库中的对话记录：history 已是列表，
+        # 避免 conversation_manager.get_conversation 先序列化成 JSON 字符串再由这里解析
+        conversation = await self.context.get_db().get_conversation_by_id(cid)
         if not conversation:
             logger.warning(f"无法获取对话 {cid}，跳过消息记录")
             return
 
-        # 解析现有历史
-        history = self._parse_conversation_history(conversation.history, cid)
-
         # 添加新消息（作为 assistant 角色）
+        history = list(conversation.content or [])
         history.append({"role": "assistant", "content": message})
 
         # 更新对话历史
@@ -221,22 +287,3 @@ class MessageUtils:
             umo, cid, history=history
         )
         logger.debug(f"已将消息记录到对话 {cid[:8]}... 的历史中")
-
-    def _parse_conversation_history(self, history_json: str | None, cid: str) -> list:
-        """解析对话历史 JSON
-
-        Args:
-            history_json: 历史记录 JSON 字符串
-            cid: 对话 ID（用于日志）
-
-        Returns:
-            list: 解析后的历史记录列表
-        """
-        if not history_json:
-            return []
-
-        try:
-            return json.loads(history_json)
-        except json.JSONDecodeError:
-            logger.warning(f"对话 {cid} 的历史记录格式错误，使用空历史")
-            return []
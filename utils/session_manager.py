@@ -1,53 +1,274 @@
 """Session 管理器，用于跟踪用户的默认对话 conversation ID"""
 
+import asyncio
 import json
 import os
+import sys
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict
+from types import MappingProxyType
+from typing import Dict, Mapping
 from astrbot.api import logger
 
+# 日志文件至少达到该大小才考虑压缩，避免小文件频繁重写快照
+_COMPACT_MIN_BYTES = 64 * 1024
+# 日志文件超过快照大小的该倍数时压缩
+_COMPACT_RATIO = 4
+# 追加写打开修改日志；Windows 上需要 O_BINARY 避免换行符转换
+_LOG_OPEN_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0)
+
 
 class SessionManager:
-    """管理每个用户 (unified_msg_origin) 的默认对话 conversation ID"""
+    """管理每个用户 (unified_msg_origin) 的默认对话 conversation ID
+
+    持久化由两部分组成：快照文件 user_conversations.json 和只追加的修改日志
+    user_conversations.log。每次修改只向日志追加一行，日志过大时重写快照并清空日志；
+    加载时先读快照，再按顺序重放日志。
+    """
 
-    def __init__(self, save_dir: str | Path):
+    def __init__(
+        self,
+        save_dir: str | Path,
+        flush_delay: float = 0.2,
+        capacity: int = 100_000,
+        persist: bool = True,
+    ):
         """初始化 SessionManager
 
         Args:
             save_dir: 数据存储目录
+            flush_delay: 修改后延迟写入文件的秒数，窗口内的多次修改只写一次
+            capacity: 最多保存的用户数，超出时淘汰最久未使用的用户
+            persist: 是否持久化到文件；为 False 时映射只保存在内存中，
+                不读写任何文件，重启后所有用户都会重新创建专属对话
         """
-        self.save_dir = save_dir
-        self.session_file = os.path.join(save_dir, "user_conversations.json")
-        # {unified_msg_origin: conversation_id}
-        self.user_conversations: Dict[str, str] = {}
+        self.save_dir = Path(save_dir)
+        self.session_file = self.save_dir / "user_conversations.json"
+        self.session_log = self.save_dir / "user_conversations.log"
+        self._session_tmp = self.save_dir / "user_conversations.json.tmp"
+        self.capacity = capacity
+        self.persist = persist
+        # {unified_msg_origin: conversation_id}，按最近使用排序，最久未使用的在最前
+        self.user_conversations: OrderedDict[str, str] = OrderedDict()
+        self._flush_delay = flush_delay
+        # 尚未写入日志的修改记录（每条一行 JSON），以及等待中的延迟写入
+        self._pending: list[str] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        # 快照与日志的当前大小，用于判断何时压缩
+        self._snapshot_size = 0
+        self._log_size = 0
+        # 上次写入失败时，下次写入完整快照
+        self._needs_compact = False
+        # 保护内存映射与待写入记录；可重入，没有事件循环时修改会在持锁状态下直接写入
+        self._lock = threading.RLock()
+        # 保护文件写入，避免工作线程与其他线程同时写同一文件
+        self._io_lock = threading.RLock()
+        # 修改日志的追加写文件描述符，首次写入时打开并复用，压缩时关闭
+        self._log_fd: int | None = None
+        # 文件写入在工作线程中执行，锁保证各批次按顺序写入；保留任务引用防止被回收
+        self._write_lock = asyncio.Lock()
+        self._write_tasks: set[asyncio.Task] = set()
         self._load_sessions()
 
     def _load_sessions(self):
-        """从文件加载已保存的 conversation 映射"""
-        if os.path.exists(self.session_file):
+        """从快照加载已保存的 conversation 映射，再重放修改日志"""
+        if not self.persist:
+            return
+        if self.session_file.exists():
             try:
                 with open(self.session_file, "r", encoding="utf-8") as f:
-                    self.user_conversations = json.load(f)
-                logger.info(
-                    f"加载了 {len(self.user_conversations)} 个用户的默认 conversation 映射"
-                )
+                    self.user_conversations = OrderedDict(
+                        (sys.intern(k), v) for k, v in json.load(f).items()
+                    )
+                self._snapshot_size = self.session_file.stat().st_size
             except Exception as e:
                 logger.error(f"加载 conversation 映射文件失败: {e}")
-                self.user_conversations = {}
-        else:
+                self.user_conversations = OrderedDict()
+        elif not self.session_log.exists():
             logger.info("未找到 conversation 映射文件，将创建新的映射")
+        self._replay_log()
+        if len(self.user_conversations) > self.capacity:
+            # 容量调小后首次加载：淘汰多余用户并写入一次快照
+            while len(self.user_conversations) > self.capacity:
+                self.user_conversations.popitem(last=False)
+            self._save_sessions()
+        logger.info("加载了 %d 个用户的默认 conversation 映射", len(self.user_conversations))
+
+    def _replay_log(self):
+        """按顺序重放修改日志；崩溃时写了一半的末行会被跳过"""
+        if not self.session_log.exists():
+            return
+        torn = False
+        try:
+            with open(self.session_log, "r", encoding="utf-8") as f:
+                for line in f:
+                    torn = not line.endswith("\n")
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning("conversation 映射日志中有无法解析的记录，已跳过")
+                        continue
+                    if record.get("op") == "s":
+                        key = sys.intern(record["k"])
+                        self.user_conversations[key] = record["v"]
+                        self.user_conversations.move_to_end(key)
+                    elif record.get("op") == "d":
+                        self.user_conversations.pop(record["k"], None)
+            self._log_size = self.session_log.stat().st_size
+        except Exception as e:
+            logger.error(f"重放 conversation 映射日志失败: {e}")
+            return
+        if torn:
+            # 末行不完整时立即压缩，避免后续追加的记录接在残行后面
+            self._save_sessions()
 
     def _save_sessions(self):
-        """保存 conversation 映射到文件"""
+        """在当前线程保存 conversation 映射快照，并清空修改日志"""
+        if not self.persist:
+            return
+        with self._lock:
+            if self._write_snapshot(self.user_conversations):
+                self._log_size = 0
+                self._needs_compact = False
+
+    def _write_snapshot(self, conversations: Dict[str, str]) -> bool:
+        """将映射快照写入文件，并清空已并入快照的修改日志
+
+        Args:
+            conversations: 要写入的映射，在工作线程中调用时须为副本
+
+        Returns:
+            bool: 是否写入成功
+        """
         try:
-            os.makedirs(self.save_dir, exist_ok=True)
-            with open(self.session_file, "w", encoding="utf-8") as f:
-                json.dump(self.user_conversations, f, ensure_ascii=False, indent=2)
-            logger.debug(
-                f"已保存 {len(self.user_conversations)} 个用户的 conversation 映射"
-            )
+            with self._io_lock:
+                self.save_dir.mkdir(parents=True, exist_ok=True)
+                # 先写入临时文件并落盘，再原子替换，崩溃时不会留下写了一半的快照
+                with open(self._session_tmp, "w", encoding="utf-8") as f:
+                    json.dump(
+                        conversations, f, ensure_ascii=False, separators=(",", ":")
+                    )
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(self._session_tmp, self.session_file)
+                self._snapshot_size = self.session_file.stat().st_size
+                # 先写快照再清空日志：两步之间崩溃时，重放日志的结果与快照一致
+                self._close_log_fd()
+                open(self.session_log, "w").close()
+            logger.debug("已保存 %d 个用户的 conversation 映射", len(conversations))
+            return True
         except Exception as e:
             logger.error(f"保存 conversation 映射文件失败: {e}")
+            return False
+
+    def _write_batch(self, data: bytes, snapshot: Dict[str, str] | None) -> bool:
+        """将一批修改记录追加到日志；给定快照时随后压缩
+
+        只访问传入的参数，可以在工作线程中执行。
+
+        Returns:
+            bool: 是否写入成功
+        """
+        with self._io_lock:
+            try:
+                if self._log_fd is None:
+                    self.save_dir.mkdir(parents=True, exist_ok=True)
+                    self._log_fd = os.open(self.session_log, _LOG_OPEN_FLAGS, 0o644)
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(self._log_fd, view) :]
+            except Exception as e:
+                self._close_log_fd()
+                logger.error(f"写入 conversation 映射日志失败: {e}")
+                return False
+            return snapshot is None or self._write_snapshot(snapshot)
+
+    def _close_log_fd(self):
+        """关闭缓存的日志文件描述符，下次写入时重新打开"""
+        with self._io_lock:
+            if self._log_fd is None:
+                return
+            try:
+                os.close(self._log_fd)
+            except OSError as e:
+                logger.warning(f"关闭 conversation 映射日志失败: {e}")
+            self._log_fd = None
+
+    def _schedule_save(self, op: str, key: str, value: str | None = None):
+        """记录一次修改，在 flush_delay 秒后统一追加到日志
+
+        没有运行中的事件循环时（例如初始化阶段）立即写入。
+
+        Args:
+            op: "s" 表示设置，"d" 表示删除
+            key: unified_msg_origin
+            value: conversation_id，删除时为 None
+        """
+        if not self.persist:
+            return
+        record = {"op": op, "k": key}
+        if value is not None:
+            record["v"] = value
+        self._pending.append(
+            json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        )
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._flush()
+            return
+        self._flush_handle = loop.call_later(self._flush_delay, self._flush)
+
+    def _flush(self):
+        """将尚未保存的修改交给后台线程追加到日志，日志过大时附带快照压缩"""
+        with self._lock:
+            self._flush_handle = None
+            if not self._pending:
+                return
+            data = "".join(self._pending).encode("utf-8")
+            self._pending = []
+            self._log_size += len(data)
+            snapshot = None
+            if self._needs_compact or self._log_size > max(
+                _COMPACT_MIN_BYTES, _COMPACT_RATIO * self._snapshot_size
+            ):
+                # 持锁复制映射，工作线程只读取副本
+                snapshot = dict(self.user_conversations)
+                self._log_size = 0
+                self._needs_compact = False
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self._on_batch_written(self._write_batch(data, snapshot))
+                return
+        task = loop.create_task(self._write_batch_async(data, snapshot))
+        self._write_tasks.add(task)
+        task.add_done_callback(self._write_tasks.discard)
+
+    async def _write_batch_async(self, data: bytes, snapshot: Dict[str, str] | None):
+        """在工作线程中写入一批修改，写入按提交顺序串行执行"""
+        async with self._write_lock:
+            ok = await asyncio.to_thread(self._write_batch, data, snapshot)
+        self._on_batch_written(ok)
+
+    def _on_batch_written(self, ok: bool):
+        """写入失败时要求下次写入完整快照，保证修改不丢失"""
+        if not ok:
+            self._needs_compact = True
+
+    async def aclose(self):
+        """取消等待中的延迟写入，写入尚未保存的修改并等待后台写入完成"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self._flush()
+        if self._write_tasks:
+            await asyncio.gather(*self._write_tasks, return_exceptions=True)
+        if self._needs_compact:
+            self._save_sessions()
+        self._close_log_fd()
 
     def set_user_conversation(self, unified_msg_origin: str, conversation_id: str):
         """设置用户的默认 conversation ID
@@ -56,11 +277,25 @@ class SessionManager:
             unified_msg_origin: 统一消息来源标识符（用户的唯一标识）
             conversation_id: 对话 ID (cid)
         """
-        self.user_conversations[unified_msg_origin] = conversation_id
-        self._save_sessions()
+        # 驻留 key：同一用户的 umo 只保留一份，查找时可直接比较引用
+        unified_msg_origin = sys.intern(unified_msg_origin)
+        with self._lock:
+            # 映射未变化时只刷新使用顺序，不产生写入
+            if self.user_conversations.get(unified_msg_origin) == conversation_id:
+                self.user_conversations.move_to_end(unified_msg_origin)
+                return
+            self.user_conversations[unified_msg_origin] = conversation_id
+            self.user_conversations.move_to_end(unified_msg_origin)
+            self._schedule_save("s", unified_msg_origin, conversation_id)
+            evicted = None
+            if len(self.user_conversations) > self.capacity:
+                evicted, _ = self.user_conversations.popitem(last=False)
+                self._schedule_save("d", evicted)
         logger.debug(
-            f"设置用户 {unified_msg_origin} 的默认 conversation 为 {conversation_id[:8]}..."
+            "设置用户 %s 的默认 conversation 为 %.8s...", unified_msg_origin, conversation_id
         )
+        if evicted is not None:
+            logger.debug("淘汰最久未使用的用户 %s 的默认 conversation", evicted)
 
     def get_user_conversation(self, unified_msg_origin: str) -> str | None:
         """获取用户的默认 conversation ID
@@ -71,7 +306,11 @@ class SessionManager:
         Returns:
             对话 ID (cid)，如果不存在则返回 None
         """
-        return self.user_conversations.get(unified_msg_origin)
+        with self._lock:
+            cid = self.user_conversations.get(unified_msg_origin)
+            if cid is not None:
+                self.user_conversations.move_to_end(unified_msg_origin)
+        return cid
 
     def remove_user_conversation(self, unified_msg_origin: str):
         """移除用户的默认 conversation ID
@@ -79,11 +318,16 @@ class SessionManager:
         Args:
             unified_msg_origin: 统一消息来源标识符（用户的唯一标识）
         """
-        if unified_msg_origin in self.user_conversations:
+        with self._lock:
+            if unified_msg_origin not in self.user_conversations:
+                return
             del self.user_conversations[unified_msg_origin]
-            self._save_sessions()
-            logger.debug(f"移除用户 {unified_msg_origin} 的默认 conversation")
+            self._schedule_save("d", unified_msg_origin)
+        logger.debug("移除用户 %s 的默认 conversation", unified_msg_origin)
 
-    def get_all_conversations(self) -> Dict[str, str]:
-        """获取所有用户的 conversation 映射"""
-        return self.user_conversations.copy()
+    def get_all_conversations(self) -> Mapping[str, str]:
+        """获取所有用户的 conversation 映射
+
+        返回只读视图而不是副本，会随后续修改变化
+        """
+        return MappingProxyType(self.user_conversations)